@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Up', 'Down', 'Volume']
+
+
+class BarBuilder:
+    """
+    Builds OHLC bars of one frequency from tick chunks that arrive in timestamp order.
+    The last bar of a chunk is kept open until a tick of a later bar arrives, so chunks can split a bar anywhere.
+
+    frequency: Fixed bar length understood by pandas, e.g. '1min', '5min' or '1h'
+    """
+
+    def __init__(self, frequency):
+        self.frequency = frequency
+        self.step = pd.Timedelta(frequency).value
+        if self.step <= 0:
+            raise ValueError(f"Bar frequency must be positive, got {frequency}")
+        self.pending = None
+        self.last_time = None
+
+    def push(self, ticks):
+        """
+        Adds a chunk of ticks and returns the bars that are finished, as a DataFrame like resample_data returns.
+        """
+        times = ticks.index.values.astype('datetime64[ns]').view(np.int64)
+        if len(times) == 0:
+            return self._frame(None)
+        if np.any(np.diff(times) < 0) or (self.last_time is not None and times[0] < self.last_time):
+            raise ValueError("Ticks must arrive in timestamp order")
+        self.last_time = times[-1]
+
+        # Bars start at multiples of the frequency, the same as resample() for lengths that divide a day
+        buckets = times // self.step
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        ends = np.concatenate((starts[1:], [len(times)]))
+        bars = {
+            'Bucket': buckets[starts],
+            'Open': ticks['Open'].to_numpy()[starts],
+            'High': np.maximum.reduceat(ticks['High'].to_numpy(), starts),
+            'Low': np.minimum.reduceat(ticks['Low'].to_numpy(), starts),
+            'Close': ticks['Close'].to_numpy()[ends - 1],
+            'Up': np.add.reduceat(ticks['Up'].to_numpy(dtype=np.int64), starts),
+            'Down': np.add.reduceat(ticks['Down'].to_numpy(dtype=np.int64), starts),
+        }
+
+        if self.pending is not None:
+            if self.pending['Bucket'] == bars['Bucket'][0]:
+                # The chunk continues the open bar
+                bars['Open'][0] = self.pending['Open']
+                bars['High'][0] = max(bars['High'][0], self.pending['High'])
+                bars['Low'][0] = min(bars['Low'][0], self.pending['Low'])
+                bars['Up'][0] += self.pending['Up']
+                bars['Down'][0] += self.pending['Down']
+            else:
+                bars = {column: np.concatenate(([self.pending[column]], values)) for column, values in bars.items()}
+
+        self.pending = {column: values[-1] for column, values in bars.items()}
+        return self._frame({column: values[:-1] for column, values in bars.items()})
+
+    def flush(self):
+        """
+        Returns the bar that is still open, at the end of the tick stream.
+        """
+        if self.pending is None:
+            return self._frame(None)
+        bars = {column: np.array([value]) for column, value in self.pending.items()}
+        self.pending = None
+        return self._frame(bars)
+
+    def _frame(self, bars):
+        if bars is None:
+            bars = {column: np.array([], dtype=np.int64) for column in ['Bucket'] + BAR_COLUMNS[:-1]}
+        index = pd.DatetimeIndex(bars['Bucket'] * self.step, name='DateTime')
+        data = pd.DataFrame({column: bars[column] for column in BAR_COLUMNS[:-1]}, index=index)
+        data['Volume'] = data['Up'] + data['Down']
+        return data
+
+
+def resample_stream(chunks, frequencies=('1min',)):
+    """
+    Converts a stream of tick chunks (e.g. from fun.read_csv_chunks) to bars of several frequencies in one pass.
+    Yields a dict of frequency -> finished bars per chunk, and the remaining open bars at the end.
+    """
+    builders = [BarBuilder(frequency) for frequency in frequencies]
+    for chunk in chunks:
+        yield {builder.frequency: builder.push(chunk) for builder in builders}
+    yield {builder.frequency: builder.flush() for builder in builders}
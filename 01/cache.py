@@ -0,0 +1,79 @@
+import glob
+import hashlib
+import os
+
+import pandas as pd
+
+import instrument
+
+CACHE_DIR_NAME = '.cache'
+
+
+def _digest(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+
+def _cache_dir(source):
+    return os.path.join(os.path.dirname(os.path.abspath(source)), CACHE_DIR_NAME)
+
+
+def _cache_prefix(source, key):
+    return os.path.join(_cache_dir(source), f"{os.path.basename(source)}-{_digest(os.path.abspath(source), key)}")
+
+
+def cache_path(source, key=''):
+    """
+    Returns the Parquet file that caches the parsed source. The name changes with the source size and mtime.
+    """
+    stat = os.stat(source)
+    return f"{_cache_prefix(source, key)}-{_digest(stat.st_size, stat.st_mtime_ns)}.parquet"
+
+
+def cached(source, reader, key=''):
+    """
+    Returns reader(source), parsing the source only when there is no cache for its current size and mtime.
+
+    source: Path of the file that is parsed
+    reader: Function that parses the source into a DataFrame
+    key: Anything that changes what reader returns, e.g. its parsing options
+    """
+    path = cache_path(source, key)
+    if os.path.exists(path):
+        instrument.count('cache.hit')
+        return pd.read_parquet(path)
+
+    instrument.count('cache.miss')
+    data = reader(source)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        # Older versions of the source can not be read again
+        invalidate(source, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data.to_parquet(temporary_path)
+        os.replace(temporary_path, path)
+    except OSError:
+        # E.g. a read-only data directory: the parsed data is still good, it is just parsed again next time
+        instrument.count('cache.write_error')
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+    return data
+
+
+def invalidate(source, key=None):
+    """
+    Removes the cached copies of the source, for one reader key or for all of them.
+    """
+    if key is None:
+        pattern = os.path.join(glob.escape(_cache_dir(source)), f"{glob.escape(os.path.basename(source))}-*.parquet")
+    else:
+        pattern = f"{glob.escape(_cache_prefix(source, key))}-*.parquet"
+    for path in glob.glob(pattern):
+        os.remove(path)
+
+
+def refresh(source, reader, key=''):
+    """
+    Parses the source again and replaces its cached copy.
+    """
+    invalidate(source, key)
+    return cached(source, reader, key)
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+# Columns that are added up when bars are merged, every other extra column keeps its last value
+SUM_COLUMNS = ['Volume', 'Up', 'Down']
+
+
+def lttb(x, y, max_points):
+    """
+    Largest-Triangle-Three-Buckets: picks max_points positions of a line that keep its visual shape.
+    The first and last points are always kept, every bucket in between keeps the point that forms the largest
+    triangle with the previously kept point and the average of the next bucket.
+    """
+    length = len(y)
+    if max_points >= length or max_points < 3:
+        return np.arange(length)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, length - 1, max_points - 1).astype(int)
+    edges = np.append(edges, length)
+
+    selected = np.empty(max_points, dtype=int)
+    selected[0] = 0
+    selected[-1] = length - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_start, next_stop = edges[bucket + 1], edges[bucket + 2]
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+        area = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def decimate_line(series, max_points):
+    """
+    Reduces a series with a datetime index to about max_points points for a line chart.
+    Missing values are kept as breaks in the line: one of every run of them stays between the kept points.
+    """
+    missing = series.isna().to_numpy()
+    valid = np.flatnonzero(~missing)
+    if max_points is None or len(valid) <= max_points:
+        return series
+    x = series.index.values.astype('datetime64[ns]').view(np.int64)[valid]
+    y = series.to_numpy()[valid]
+    # LTTB can skip the single highest or lowest point, which is the one a chart must show
+    selected = valid[np.union1d(lttb(x, y, max_points), [np.argmin(y), np.argmax(y)])]
+    gaps = np.flatnonzero(missing & ~np.concatenate(([False], missing[:-1])))
+    return series.iloc[np.union1d(selected, gaps)]
+
+
+def decimate_ohlc(data, max_points):
+    """
+    Merges consecutive bars so that at most max_points candles are left. Every merged candle keeps the first open,
+    the highest high, the lowest low and the last close, so no extreme is lost. Volumes are added up and any other
+    column (e.g. an indicator) keeps its last value.
+    """
+    if max_points is None or len(data) <= max_points:
+        return data
+
+    starts = np.linspace(0, len(data), max_points, endpoint=False).astype(int)
+    starts = np.unique(starts)
+    ends = np.append(starts[1:], len(data))
+
+    merged = {}
+    for column in data.columns:
+        values = data[column].to_numpy()
+        if column == 'Open':
+            merged[column] = values[starts]
+        elif column == 'High':
+            merged[column] = np.fmax.reduceat(values, starts)
+        elif column == 'Low':
+            merged[column] = np.fmin.reduceat(values, starts)
+        elif column in SUM_COLUMNS:
+            merged[column] = np.add.reduceat(values, starts)
+        else:
+            merged[column] = values[ends - 1]
+    return pd.DataFrame(merged, index=data.index[starts], columns=data.columns)
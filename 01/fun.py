@@ -1,25 +1,114 @@
+import collections
+
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import mplfinance as mpf
 import numpy as np
 import pandas as pd
 
+import cache
+import decimate
+import instrument
+import store
+
+# Price columns read_csv_chunks stores as float32 when downcasting, like VOLUME_COLUMNS. Other data columns are float64
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+# Up and down volume of the tick and minute files. As float32 they keep missing values and whole volumes up to 2**24,
+# which daily volumes (Vol in the day files) exceed, so those stay float64
+VOLUME_COLUMNS = ['Up', 'Down']
+# Tried in order when read_csv_chunks gets no time_format, e.g. 05:30:42 in the tick files and 05:31 in the minute bars
+TIME_FORMATS = ['%H:%M:%S', '%H:%M']
 
-def load_data(file_path, date_col=None, time_col=None, parse_dates=True, index_col=None):
+
+@instrument.timed()
+def load_data(file_path, date_col=None, time_col=None, parse_dates=True, index_col=None, use_cache=True):
     """
     Loads data from a specified file path. Can handle combining date and time columns into a datetime index.
+
+    use_cache: Keep the parsed data in a Parquet cache next to the file, so only the first load parses the CSV
     """
-    data = pd.read_csv(file_path, parse_dates=parse_dates, index_col=index_col)
-    if date_col and time_col:
-        data['DateTime'] = pd.to_datetime(data[date_col] + ' ' + data[time_col])
-        data.set_index('DateTime', inplace=True)
-        data.drop(columns=[date_col, time_col], inplace=True)
-    return data
+    def read(path):
+        data = pd.read_csv(path, parse_dates=parse_dates, index_col=index_col)
+        if date_col and time_col:
+            data['DateTime'] = pd.to_datetime(data[date_col] + ' ' + data[time_col])
+            data.set_index('DateTime', inplace=True)
+            data.drop(columns=[date_col, time_col], inplace=True)
+        return data
+
+    if not use_cache:
+        return read(file_path)
+    return cache.cached(file_path, read, key=('load_data', date_col, time_col, parse_dates, index_col))
+
+
+def _to_datetime(values, formats):
+    # Returns the parsed values and the first of the formats that parses all of them
+    for datetime_format in formats[:-1]:
+        try:
+            return pd.to_datetime(values, format=datetime_format), datetime_format
+        except ValueError:
+            pass
+    return pd.to_datetime(values, format=formats[-1]), formats[-1]
+
+
+@instrument.timed()
+def read_csv_chunks(file_path, date_col='Date', time_col='Time', date_format='%m/%d/%Y', time_format=None,
+                    chunk_size=1_000_000, downcast=True):
+    """
+    Reads a large CSV in chunks of chunk_size rows, so memory use does not grow with the file size.
+    Yields DataFrames with a datetime index parsed with an explicit format. Every chunk has the same dtypes
+    whatever its values look like, so the chunks can be appended to one store.
+
+    time_col: Set to None when date_col already holds the full date and time
+    time_format: Format of time_col, by default the first of TIME_FORMATS that parses the first chunk
+    downcast: Store the PRICE_COLUMNS and VOLUME_COLUMNS as float32 instead of float64
+    """
+    text_columns = [date_col] if time_col is None else [date_col, time_col]
+    if time_col is None:
+        formats = [date_format]
+    else:
+        formats = [f"{date_format} {time_format}" for time_format in ([time_format] if time_format else TIME_FORMATS)]
+    compact_dtype = np.float32 if downcast else np.float64
+    dtypes = collections.defaultdict(lambda: np.float64,
+                                     {column: compact_dtype for column in PRICE_COLUMNS + VOLUME_COLUMNS})
+    dtypes.update({column: str for column in text_columns})
+    for chunk in pd.read_csv(file_path, chunksize=chunk_size, dtype=dtypes):
+        date_time = chunk[date_col] if time_col is None else chunk[date_col] + ' ' + chunk[time_col]
+        times, datetime_format = _to_datetime(date_time, formats)
+        # Later chunks use the format of the first one
+        formats = [datetime_format]
+        chunk.index = pd.DatetimeIndex(times, name='DateTime')
+        yield chunk.drop(columns=text_columns)
+
+
+@instrument.timed()
+def ingest_csv(file_path, store_path, **chunk_options):
+    """
+    Appends a large CSV to a memory-mapped store chunk by chunk. Returns the number of rows written.
+
+    chunk_options: Passed to read_csv_chunks
+    """
+    rows = 0
+    for chunk in read_csv_chunks(file_path, **chunk_options):
+        store.append_store(store_path, chunk)
+        rows += len(chunk)
+    instrument.count('fun.ingest_csv.rows', rows)
+    return rows
+
+
+@instrument.timed()
+def load_store(store_path, start=None, end=None):
+    """
+    Loads the [start, end) time range of a memory-mapped store written with store.write_store.
+    """
+    return store.OHLCVStore(store_path).frame(start, end)
 
 
-def plot_data(data, dformat, plot_type='line', title='Stock Data', add_sessions=False):
+@instrument.timed()
+def plot_data(data, dformat, plot_type='line', title='Stock Data', add_sessions=False, max_points=2000):
     """
     Plots the data as either a line chart or a candlestick chart, with an optional volume panel and session shading.
+
+    max_points: Number of points drawn at most, longer data is decimated first (None draws every bar)
     """
     date_format = '%Y-%m-%d'
     if dformat == 'daily':
@@ -34,7 +123,8 @@ def plot_data(data, dformat, plot_type='line', title='Stock Data', add_sessions=
         fig, ax = plt.subplots(figsize=(14, 7))
 
         # Plot the Close price line chart
-        ax.plot(data.index, data['Close'], label='Close Price', color='blue', linewidth=1)
+        close = decimate.decimate_line(data['Close'], max_points)
+        ax.plot(close.index, close, label='Close Price', color='blue', linewidth=1)
 
         # Add session shading
         if add_sessions:
@@ -67,19 +157,22 @@ def plot_data(data, dformat, plot_type='line', title='Stock Data', add_sessions=
             'datetime_format': date_format,
         }
         # Plot the candlestick chart
-        mpf.plot(data, **plot_kwargs)
+        mpf.plot(decimate.decimate_ohlc(data, max_points), **plot_kwargs)
 
 
-def generate_market_data(initial_price=100, num_points=1000, volatility=0.1):
+def generate_market_data(initial_price=100, num_points=1000, volatility=0.1, seed=None):
     """
     Generates random walk market data.
+    For OHLCV bars, tick streams, correlated panels and data larger than memory see the synthetic module.
 
     initial_price: The starting price of the market data
     num_points: The number of data points to generate
     volatility: The standard deviation of the price changes
+    seed: Makes the data reproducible, None draws from the global NumPy random state
     """
     # Generate random price changes
-    price_changes = np.random.randn(num_points) * volatility
+    random = np.random if seed is None else np.random.RandomState(seed)
+    price_changes = random.randn(num_points) * volatility
     # Calculate the price path
     prices = initial_price + np.cumsum(price_changes)
     # Generate a DataFrame
@@ -90,46 +183,79 @@ def generate_market_data(initial_price=100, num_points=1000, volatility=0.1):
     return data
 
 
-def find_and_print_biggest_gaps(data, gap_number=10):
-    """
-    Finds and prints detailed information about the biggest gaps in time series data.
+def _trading_time(times, session, weekmask, holidays):
+    # Nanoseconds of session time between the first day in times and each timestamp
+    day_ns = pd.Timedelta(days=1).value
+    session_open = pd.Timedelta(session[0] + ':00').value
+    session_close = pd.Timedelta(session[1] + ':00').value
+    if session_close <= session_open:
+        raise ValueError("Sessions that cross midnight are not supported")
+    session_length = session_close - session_open
+
+    days = (times // day_ns).astype('datetime64[D]')
+    time_of_day = times % day_ns
+    full_sessions = np.busday_count(days.min(), days, weekmask=weekmask, holidays=holidays)
+    trading_day = np.busday_count(days, days + 1, weekmask=weekmask, holidays=holidays)
+    return full_sessions * session_length + trading_day * np.clip(time_of_day - session_open, 0, session_length)
+
+
+@instrument.timed()
+def find_gaps(data, top=10, min_gap='1min', session=None, weekmask='Mon Tue Wed Thu Fri', holidays=()):
     """
-    # Ensure the data is sorted by the index to correctly calculate time differences
-    data = data.sort_index()
+    Finds the biggest gaps between consecutive bars without changing or printing the data.
+    Returns a table with the gap start and end times, the gap length and the positions of the bars before and after it.
 
-    # Calculate time differences between consecutive entries
-    data['Time_Diff'] = data.index.to_series().diff()
+    top: Number of gaps to return, None returns every gap longer than min_gap
+    session: Optional ('09:30', '16:00') trading hours. Time outside the session, on weekends and holidays is
+             not counted, so overnight and weekend closures are not reported as gaps
+    weekmask, holidays: Trading days of the session, as understood by numpy.busday_count
+    """
+    times = data.index.values.astype('datetime64[ns]').view(np.int64)
+    order = np.argsort(times, kind='stable')
+    times = times[order]
+
+    lengths = np.diff(times)
+    if session is not None and len(times):
+        lengths = np.diff(_trading_time(times, session, weekmask, holidays))
+    gaps = np.flatnonzero(lengths > pd.Timedelta(min_gap).value)
+
+    if top is not None and len(gaps) > top:
+        # Partial sort: only the top gaps are ordered
+        gaps = gaps[np.argpartition(-lengths[gaps], top - 1)[:top]]
+    gaps = gaps[np.lexsort((gaps, -lengths[gaps]))]
+
+    table = pd.DataFrame({
+        'start': times[gaps].astype('datetime64[ns]'),
+        'end': times[gaps + 1].astype('datetime64[ns]'),
+        'length': (times[gaps + 1] - times[gaps]).astype('timedelta64[ns]'),
+        'before': order[gaps],
+        'after': order[gaps + 1],
+    })
+    if session is not None:
+        table.insert(3, 'session_length', lengths[gaps].astype('timedelta64[ns]'))
+    return table
 
-    # Identify gaps
-    gaps = data[data['Time_Diff'] > pd.Timedelta(minutes=1)].copy()
-    gaps['Gap_Length'] = gaps['Time_Diff']
 
-    # Sort the gaps by length to find the largest ones
-    biggest_gaps = gaps.nlargest(gap_number, 'Gap_Length')
+def find_and_print_biggest_gaps(data, gap_number=10):
+    """
+    Finds and prints detailed information about the biggest gaps in time series data.
+    Returns every gap longer than a minute (see find_gaps), biggest first.
+    """
+    gaps = find_gaps(data, top=None)
 
     print(f"The {gap_number} largest gaps in the data were:")
-    for i, (index, row) in enumerate(biggest_gaps.iterrows(), start=1):
-        gap_start = index - row['Time_Diff']
-        gap_end = index
-        print(f"{i}. Gap Length: {row['Gap_Length']}, Start: {gap_start}, End: {gap_end}")
-
-        # Optionally, print data points just before and after the gap for context
-        if gap_start in data.index:
-            print(f"    Data before the gap: {data.loc[gap_start]}")
-        else:
-            print("    Data before the gap is not available.")
-
-        if gap_end in data.index:
-            print(f"    Data after the gap: {data.loc[gap_end]}")
-        else:
-            print("    Data after the gap is not available.")
+    for i, gap in enumerate(gaps.head(gap_number).itertuples(), start=1):
+        print(f"{i}. Gap Length: {gap.length}, Start: {gap.start}, End: {gap.end}")
+        # Print data points just before and after the gap for context
+        print(f"    Data before the gap: {data.iloc[gap.before]}")
+        print(f"    Data after the gap: {data.iloc[gap.after]}")
 
     return gaps
 
 
 def visualize_gaps_with_candlestick(data, gaps):
     """
-    Visualizes gaps on a candlestick chart.
+    Visualizes gaps from find_gaps on a candlestick chart.
     """
     mc = mpf.make_marketcolors(up='green', down='red', edge='inherit', wick='inherit')
     s = mpf.make_mpf_style(marketcolors=mc, gridstyle='--')
@@ -137,16 +263,16 @@ def visualize_gaps_with_candlestick(data, gaps):
     fig, ax = plt.subplots(figsize=(14, 7))
     mpf.plot(data, type='candle', style=s, ax=ax, show_nontrading=True)
 
-    for i, (start, gap) in enumerate(gaps.iterrows()):
-        end = start + gap['Time_Diff']  # Calculate the end of the gap
-        # Shift the shaded area back by the length of the gap to highlight the correct range
-        ax.axvspan(start - gap['Time_Diff'], end - gap['Time_Diff'], color='red', alpha=0.5)
+    top = data['High'].max()
+    for i, (start, end) in enumerate(zip(gaps['start'], gaps['end']), start=1):
+        ax.axvspan(start, end, color='red', alpha=0.5)
         # Add text annotation for the gap number
-        ax.text(start - gap['Time_Diff'], data['High'].max(), f'Gap {i + 1}', color='blue', fontsize=9)
+        ax.text(start, top, f'Gap {i}', color='blue', fontsize=9)
 
     plt.show()
 
 
+@instrument.timed()
 def resample_data(data, frequency='1min'):
     """
     Resamples the tick data into bars of a specified frequency.
@@ -0,0 +1,216 @@
+import atexit
+import contextlib
+import cProfile
+import functools
+import inspect
+import json
+import os
+import pstats
+import threading
+import time
+
+import pandas as pd
+
+# Off unless INSTRUMENT=1, so the hot paths only pay for one flag check.
+# INSTRUMENT_OUTPUT=stats.json (or .csv) turns it on and writes the summary when the process exits,
+# INSTRUMENT_PROFILE=run.prof captures a cProfile of the whole process.
+# Every process keeps its own statistics, calls made inside worker processes are not collected.
+ENABLED = os.environ.get('INSTRUMENT', '') == '1' or bool(os.environ.get('INSTRUMENT_OUTPUT'))
+
+# Latencies are counted in power of two nanosecond buckets: bucket b holds calls that took under 2^b ns
+_BUCKETS = 64
+
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_null = contextlib.nullcontext()
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+def record(name, nanoseconds):
+    """
+    Adds one call of nanoseconds to the latency histogram of a stage.
+    """
+    with _lock:
+        stage = _stages.get(name)
+        if stage is None:
+            stage = _stages[name] = {'count': 0, 'total': 0, 'min': nanoseconds, 'max': nanoseconds,
+                                     'histogram': [0] * _BUCKETS}
+        stage['count'] += 1
+        stage['total'] += nanoseconds
+        stage['min'] = min(stage['min'], nanoseconds)
+        stage['max'] = max(stage['max'], nanoseconds)
+        stage['histogram'][min(int(nanoseconds).bit_length(), _BUCKETS - 1)] += 1
+
+
+def count(name, value=1):
+    """
+    Adds value to a counter, e.g. the number of rows a loader read.
+    """
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter_ns() - self.start)
+        return False
+
+
+def stage(name):
+    """
+    Context manager that times the block as one call of the named stage.
+    """
+    return _Stage(name) if ENABLED else _null
+
+
+def timed(name=None):
+    """
+    Decorator that times every call of a function. The stage is named module.function unless a name is given.
+    For generator functions every produced item counts as one call, timed without the consumer's work.
+    """
+
+    def decorator(func):
+        stage_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                iterator = func(*args, **kwargs)
+                if not ENABLED:
+                    return (yield from iterator)
+                while True:
+                    start = time.perf_counter_ns()
+                    try:
+                        item = next(iterator)
+                    except StopIteration as stop:
+                        return stop.value
+                    record(stage_name, time.perf_counter_ns() - start)
+                    yield item
+
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(stage_name, time.perf_counter_ns() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def _percentile(stage, fraction):
+    # Upper bound of the bucket holding the given fraction of the calls, within the measured min and max
+    seen = 0
+    for bucket, calls in enumerate(stage['histogram']):
+        seen += calls
+        if seen >= fraction * stage['count']:
+            return min(max(2 ** bucket, stage['min']), stage['max']) / 1e9
+    return float('nan')
+
+
+def summary():
+    """
+    Returns one row per stage with the call count, total and mean seconds and latency percentiles,
+    followed by one row per counter.
+    """
+    with _lock:
+        stages = {name: dict(stage, histogram=list(stage['histogram'])) for name, stage in _stages.items()}
+        counters = dict(_counters)
+    rows = [{
+        'name': name,
+        'kind': 'stage',
+        'count': stage['count'],
+        'total_seconds': stage['total'] / 1e9,
+        'mean_seconds': stage['total'] / stage['count'] / 1e9,
+        'min_seconds': stage['min'] / 1e9,
+        'p50_seconds': _percentile(stage, 0.5),
+        'p90_seconds': _percentile(stage, 0.9),
+        'p99_seconds': _percentile(stage, 0.99),
+        'max_seconds': stage['max'] / 1e9,
+    } for name, stage in sorted(stages.items(), key=lambda item: -item[1]['total'])]
+    rows += [{'name': name, 'kind': 'counter', 'count': value} for name, value in sorted(counters.items())]
+    return pd.DataFrame(rows, columns=['name', 'kind', 'count', 'total_seconds', 'mean_seconds', 'min_seconds',
+                                       'p50_seconds', 'p90_seconds', 'p99_seconds', 'max_seconds'])
+
+
+def export(path):
+    """
+    Writes the summary to a .csv file, or to JSON with the full latency histograms
+    (upper bound in seconds -> calls) for any other extension.
+    """
+    table = summary()
+    if path.endswith('.csv'):
+        table.to_csv(path, index=False)
+        return path
+    with _lock:
+        histograms = {name: {f"{2 ** bucket / 1e9:.9g}": calls
+                             for bucket, calls in enumerate(stage['histogram']) if calls}
+                      for name, stage in _stages.items()}
+    stages = table[table['kind'] == 'stage'].drop(columns='kind').set_index('name')
+    counters = table[table['kind'] == 'counter'].set_index('name')['count']
+    with open(path, 'w') as file:
+        json.dump({
+            'stages': {name: dict(row, histogram=histograms[name]) for name, row in stages.to_dict('index').items()},
+            'counters': {name: int(value) for name, value in counters.items()},
+        }, file, indent=2)
+    return path
+
+
+@contextlib.contextmanager
+def profile(path=None, sort='cumulative', limit=30):
+    """
+    Captures a cProfile of the block. The raw stats go to path (for snakeviz or pstats) when given,
+    otherwise the top limit functions are printed.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+        else:
+            pstats.Stats(profiler).sort_stats(sort).print_stats(limit)
+
+
+if os.environ.get('INSTRUMENT_OUTPUT'):
+    atexit.register(export, os.environ['INSTRUMENT_OUTPUT'])
+
+if os.environ.get('INSTRUMENT_PROFILE'):
+    _process_profile = profile(os.environ['INSTRUMENT_PROFILE'])
+    _process_profile.__enter__()
+    atexit.register(_process_profile.__exit__, None, None, None)
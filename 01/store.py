@@ -0,0 +1,136 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+META_FILE_NAME = 'meta.json'
+TIMESTAMP_FILE_NAME = 'timestamps.bin'
+
+
+def _column_file(path, column):
+    return os.path.join(path, f"{column}.bin")
+
+
+def _read_meta(path):
+    with open(os.path.join(path, META_FILE_NAME)) as file:
+        return json.load(file)
+
+
+def _write_meta(path, meta):
+    # Written last and replaced atomically, so readers never see a length longer than the column files
+    temporary_path = os.path.join(path, f"{META_FILE_NAME}.tmp")
+    with open(temporary_path, 'w') as file:
+        json.dump(meta, file)
+    os.replace(temporary_path, os.path.join(path, META_FILE_NAME))
+
+
+def _timestamps(data):
+    return data.index.values.astype('datetime64[ns]').view(np.int64)
+
+
+def _to_nanoseconds(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return pd.Timestamp(value).as_unit('ns').value
+
+
+def write_store(path, data):
+    """
+    Writes a DataFrame with a datetime index as a store: one flat binary file per column plus int64 nanosecond timestamps.
+    """
+    text_columns = [column for column in data.columns if not pd.api.types.is_numeric_dtype(data[column])]
+    if text_columns:
+        raise ValueError(f"Only numeric columns can be stored, got {text_columns}")
+
+    os.makedirs(path, exist_ok=True)
+    for file_name in os.listdir(path):
+        if file_name.endswith('.bin'):
+            os.remove(os.path.join(path, file_name))
+    _write_meta(path, {'length': 0, 'columns': {column: data[column].dtype.str for column in data.columns}})
+    append_store(path, data)
+
+
+def append_store(path, data):
+    """
+    Appends rows to a store, creating it when it does not exist. The rows must not be older than the stored ones.
+    """
+    if not os.path.exists(os.path.join(path, META_FILE_NAME)):
+        write_store(path, data)
+        return
+
+    meta = _read_meta(path)
+    timestamps = _timestamps(data)
+    if len(timestamps) == 0:
+        return
+    if np.any(np.diff(timestamps) < 0):
+        raise ValueError("Rows must be sorted by time")
+    if meta['length']:
+        last = np.fromfile(os.path.join(path, TIMESTAMP_FILE_NAME), dtype=np.int64, count=1,
+                           offset=8 * (meta['length'] - 1))
+        if timestamps[0] < last[0]:
+            raise ValueError("Rows must not be older than the last stored row")
+    if list(data.columns) != list(meta['columns']):
+        raise ValueError(f"Expected columns {list(meta['columns'])}, got {list(data.columns)}")
+    for column, dtype in meta['columns'].items():
+        if not np.can_cast(data[column].dtype, np.dtype(dtype), casting='same_kind'):
+            raise ValueError(f"Column {column} has dtype {data[column].dtype}, the store holds {np.dtype(dtype)}")
+
+    with open(os.path.join(path, TIMESTAMP_FILE_NAME), 'ab') as file:
+        file.write(timestamps.tobytes())
+    for column, dtype in meta['columns'].items():
+        with open(_column_file(path, column), 'ab') as file:
+            file.write(np.ascontiguousarray(data[column].to_numpy(dtype=dtype)).tobytes())
+
+    meta['length'] += len(timestamps)
+    _write_meta(path, meta)
+
+
+class OHLCVStore:
+    """
+    Memory-mapped view of a store. Time range queries return NumPy views of the files, nothing is copied.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        meta = _read_meta(path)
+        self.length = meta['length']
+        self.columns = list(meta['columns'])
+        self.timestamps = self._map(os.path.join(path, TIMESTAMP_FILE_NAME), np.int64)
+        self.arrays = {column: self._map(_column_file(path, column), np.dtype(dtype))
+                       for column, dtype in meta['columns'].items()}
+
+    def _map(self, file_name, dtype):
+        if self.length == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(file_name, dtype=dtype, mode='r', shape=(self.length,))
+
+    def __len__(self):
+        return self.length
+
+    def locate(self, start=None, end=None):
+        """
+        Returns the row positions of the [start, end) time range with a binary search over the timestamps.
+        """
+        start, end = _to_nanoseconds(start), _to_nanoseconds(end)
+        first = 0 if start is None else int(np.searchsorted(self.timestamps, start, side='left'))
+        last = self.length if end is None else int(np.searchsorted(self.timestamps, end, side='left'))
+        return first, max(first, last)
+
+    def slice(self, start=None, end=None):
+        """
+        Returns the timestamps and every column of the [start, end) time range as views of the memory-mapped files.
+        """
+        first, last = self.locate(start, end)
+        columns = {column: array[first:last] for column, array in self.arrays.items()}
+        return self.timestamps[first:last], columns
+
+    def frame(self, start=None, end=None):
+        """
+        Returns the [start, end) time range as a DataFrame for the pandas based indicators and plots.
+        """
+        timestamps, columns = self.slice(start, end)
+        index = pd.DatetimeIndex(timestamps.view('datetime64[ns]'), name='DateTime')
+        return pd.DataFrame(columns, index=index, copy=False)
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+import store
+from bars import BAR_COLUMNS
+
+TICK_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Up', 'Down']
+
+
+def _correlation_matrix(correlation, count):
+    if np.ndim(correlation) == 0:
+        matrix = np.full((count, count), float(correlation))
+        np.fill_diagonal(matrix, 1.0)
+        return matrix
+    matrix = np.asarray(correlation, dtype=float)
+    if matrix.shape != (count, count):
+        raise ValueError(f"Expected a {count} x {count} correlation matrix, got {matrix.shape}")
+    return matrix
+
+
+def _wall_times(start, trading_time, session, weekmask, holidays):
+    """
+    Converts nanoseconds of trading time since start to timestamps.
+    Without a session the clock runs continuously, with one it only runs inside the session on trading days,
+    so the data has the overnight, weekend and holiday gaps of a real market.
+    """
+    start = pd.Timestamp(start)
+    if session is None:
+        return (start.value + trading_time).astype('datetime64[ns]')
+    session_open = pd.Timedelta(session[0] + ':00').value
+    session_close = pd.Timedelta(session[1] + ':00').value
+    if session_close <= session_open:
+        raise ValueError("Sessions that cross midnight are not supported")
+    session_length = session_close - session_open
+
+    first_day = np.busday_offset(start.to_datetime64().astype('datetime64[D]'), 0, roll='forward',
+                                 weekmask=weekmask, holidays=holidays)
+    days = np.busday_offset(first_day, trading_time // session_length, weekmask=weekmask, holidays=holidays)
+    return days.astype('datetime64[ns]') + (session_open + trading_time % session_length).astype('timedelta64[ns]')
+
+
+def _normal(rng, count, cholesky):
+    # Standard normal draws with the correlation of the Cholesky factor, one column per asset
+    return rng.standard_normal((count, len(cholesky))) @ cholesky.T
+
+
+def _prices(last, shocks, volatility, drift, model):
+    if model == 'gbm':
+        return last * np.exp(np.cumsum(drift - volatility ** 2 / 2 + volatility * shocks, axis=0))
+    if model == 'walk':
+        return last + np.cumsum(drift + volatility * shocks, axis=0)
+    raise ValueError(f"Unknown price model {model}, expected 'gbm' or 'walk'")
+
+
+def generate_bar_chunks(count, chunk_size=1_000_000, tickers=None, correlation=0.0, seed=None, initial_price=100.0,
+                        volatility=0.001, drift=0.0, model='gbm', volume=10_000, start='2024-01-01',
+                        frequency='1min', session=None, weekmask='Mon Tue Wed Thu Fri', holidays=()):
+    """
+    Generates count OHLCV bars in chunks of chunk_size rows, so memory use does not grow with count.
+    Yields one DataFrame per chunk, or a dict of ticker -> DataFrame per chunk when tickers are given.
+    The same seed and chunk_size always give the same data.
+
+    tickers: Names of the assets of a panel, their returns are correlated
+    correlation: Correlation of the returns of every pair of tickers, or a full correlation matrix
+    volatility, drift: Per bar, relative to the price for 'gbm' and in price units for 'walk'
+    model: 'gbm' for geometric Brownian motion, 'walk' for the additive random walk of generate_market_data
+    volume: Median volume of a bar, split into Up and Down volume by the direction of the bar
+    session: Optional ('09:30', '16:00') trading hours, bars only fall inside them on the days of weekmask
+    """
+    names = [None] if tickers is None else list(tickers)
+    cholesky = np.linalg.cholesky(_correlation_matrix(correlation, len(names)))
+    rng = np.random.default_rng(seed)
+    step = pd.Timedelta(frequency).value
+    last = np.full(len(names), float(initial_price))
+
+    for chunk_start in range(0, count, chunk_size):
+        rows = min(chunk_size, count - chunk_start)
+        close = _prices(last, _normal(rng, rows, cholesky), volatility, drift, model)
+        open_ = np.vstack((last, close[:-1]))
+        last = close[-1]
+
+        # Wicks beyond the open and close, scaled like the price moves
+        scale = volatility * (close if model == 'gbm' else 1.0)
+        high = np.maximum(open_, close) + np.abs(rng.standard_normal(close.shape)) * scale / 2
+        low = np.minimum(open_, close) - np.abs(rng.standard_normal(close.shape)) * scale / 2
+        volumes = rng.lognormal(np.log(volume), 0.5, close.shape).astype(np.int64) + 1
+        # Rising bars trade more on the up side
+        up_share = 0.5 + 0.4 * np.tanh((close - open_) / scale)
+        up = rng.binomial(volumes, up_share)
+
+        index = pd.DatetimeIndex(_wall_times(start, np.arange(chunk_start, chunk_start + rows) * step,
+                                             session, weekmask, holidays), name='DateTime')
+        frames = {
+            name: pd.DataFrame({
+                'Open': open_[:, column], 'High': high[:, column], 'Low': low[:, column], 'Close': close[:, column],
+                'Up': up[:, column], 'Down': volumes[:, column] - up[:, column], 'Volume': volumes[:, column],
+            }, index=index, columns=BAR_COLUMNS)
+            for column, name in enumerate(names)
+        }
+        yield frames[None] if tickers is None else frames
+
+
+def generate_bars(count, tickers=None, **options):
+    """
+    Generates count OHLCV bars in memory, see generate_bar_chunks for the options.
+    Returns a DataFrame, or a dict of ticker -> DataFrame when tickers are given.
+    """
+    chunks = list(generate_bar_chunks(count, tickers=tickers, **options))
+    if tickers is None:
+        return pd.concat(chunks) if chunks else pd.DataFrame(columns=BAR_COLUMNS)
+    return {ticker: pd.concat([chunk[ticker] for chunk in chunks]) for ticker in tickers}
+
+
+def generate_tick_chunks(count, chunk_size=1_000_000, seed=None, initial_price=100.0, volatility=0.0002,
+                         tick_size=0.01, interval='1s', size=100, start='2024-01-01', session=None,
+                         weekmask='Mon Tue Wed Thu Fri', holidays=()):
+    """
+    Generates count trades in chunks of chunk_size rows, in the tick layout of data/100_tick_tsla.csv:
+    Open, High, Low and Close are the trade price and the trade size is in Up or Down by the direction of the trade.
+    The chunks can be fed to bars.resample_stream or written with write_csv and write_store.
+
+    volatility: Relative price move per trade, prices are rounded to tick_size
+    interval: Mean time between trades, the gaps are exponentially distributed
+    size: Median trade size
+    session: Optional ('09:30', '16:00') trading hours, trades only fall inside them on the days of weekmask
+    """
+    rng = np.random.default_rng(seed)
+    mean_interval = pd.Timedelta(interval).value
+    price = float(initial_price)
+    last_tick = np.round(price / tick_size) * tick_size
+    trading_time = 0
+
+    for chunk_start in range(0, count, chunk_size):
+        rows = min(chunk_size, count - chunk_start)
+        # The unrounded price walks on, so rounding does not make prices stick to a tick
+        prices = price * np.exp(np.cumsum(volatility * rng.standard_normal(rows)))
+        price = prices[-1]
+        ticks = np.round(prices / tick_size) * tick_size
+        uptick = ticks >= np.concatenate(([last_tick], ticks[:-1]))
+        last_tick = ticks[-1]
+
+        times = trading_time + np.cumsum(rng.exponential(mean_interval, rows).astype(np.int64) + 1)
+        trading_time = times[-1]
+        sizes = rng.lognormal(np.log(size), 1.0, rows).astype(np.int64) + 1
+
+        index = pd.DatetimeIndex(_wall_times(start, times, session, weekmask, holidays), name='DateTime')
+        yield pd.DataFrame({
+            'Open': ticks, 'High': ticks, 'Low': ticks, 'Close': ticks,
+            'Up': np.where(uptick, sizes, 0), 'Down': np.where(uptick, 0, sizes),
+        }, index=index, columns=TICK_COLUMNS)
+
+
+def write_csv(chunks, path, date_format='%m/%d/%Y', time_format='%H:%M:%S', float_format='%.2f'):
+    """
+    Writes generated chunks to one CSV in the Date,Time layout of the files in data/, readable by load_data and
+    fun.read_csv_chunks. Returns the number of rows written.
+    """
+    rows = 0
+    with open(path, 'w', newline='') as file:
+        for chunk in chunks:
+            chunk = chunk.copy()
+            chunk.insert(0, 'Time', chunk.index.strftime(time_format))
+            chunk.insert(0, 'Date', chunk.index.strftime(date_format))
+            chunk.to_csv(file, header=rows == 0, index=False, float_format=float_format)
+            rows += len(chunk)
+    return rows
+
+
+def write_store(chunks, path):
+    """
+    Appends generated chunks to a memory-mapped store (see store.OHLCVStore). Returns the number of rows written.
+    """
+    rows = 0
+    for chunk in chunks:
+        store.append_store(path, chunk)
+        rows += len(chunk)
+    return rows
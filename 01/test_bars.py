@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import fun
+from bars import BarBuilder, resample_stream
+
+# Trades during a short session, so the stream has empty minutes, hours and nights
+TICKS = {'seed': 3, 'interval': '5s', 'session': ('09:30', '10:30')}
+
+
+def _stream(ticks, chunk_size, frequency):
+    chunks = (ticks.iloc[start:start + chunk_size] for start in range(0, len(ticks), chunk_size))
+    return pd.concat([bars[frequency] for bars in resample_stream(chunks, [frequency])])
+
+
+@pytest.mark.parametrize('frequency', ['1min', '5min', '1h'])
+@pytest.mark.parametrize('chunk_size', [1, 7, 400, 1_500])
+def test_stream_matches_resample_data(synthetic_ticks, chunk_size, frequency):
+    ticks = synthetic_ticks(1_500, **TICKS)
+    expected = fun.resample_data(ticks.copy(), frequency=frequency)
+    bars = _stream(ticks, chunk_size, frequency)
+    assert bars['Volume'].sum() == ticks['Up'].sum() + ticks['Down'].sum()
+    pd.testing.assert_frame_equal(bars[expected.columns], expected, check_dtype=False, check_freq=False,
+                                  check_names=False)
+
+
+def test_frequencies_share_one_pass(synthetic_ticks):
+    ticks = synthetic_ticks(2_000, **TICKS)
+    chunks = [ticks.iloc[start:start + 300] for start in range(0, len(ticks), 300)]
+    results = list(resample_stream(chunks, ['1min', '15min']))
+    assert len(results) == len(chunks) + 1
+    for frequency in ['1min', '15min']:
+        bars = pd.concat([result[frequency] for result in results])
+        np.testing.assert_allclose(bars['Close'], fun.resample_data(ticks.copy(), frequency=frequency)['Close'])
+
+
+def test_ticks_must_be_in_order(synthetic_ticks):
+    ticks = synthetic_ticks(100, **TICKS)
+    builder = BarBuilder('1min')
+    builder.push(ticks.iloc[50:])
+    with pytest.raises(ValueError):
+        builder.push(ticks.iloc[:50])
+    with pytest.raises(ValueError):
+        BarBuilder('0min')
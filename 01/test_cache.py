@@ -0,0 +1,86 @@
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+import cache
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'prices.csv'
+    path.write_text('Close\n1.0\n2.0\n')
+    return str(path)
+
+
+def _counting_reader(calls):
+    def read(path):
+        calls.append(path)
+        return pd.read_csv(path)
+    return read
+
+
+def _cached_files(source):
+    return glob.glob(os.path.join(os.path.dirname(source), cache.CACHE_DIR_NAME, '*'))
+
+
+def test_source_is_parsed_once(source):
+    calls = []
+    first = cache.cached(source, _counting_reader(calls))
+    second = cache.cached(source, _counting_reader(calls))
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first, second)
+    assert _cached_files(source) == [cache.cache_path(source)]
+
+
+def test_changed_sources_are_parsed_again(source):
+    calls = []
+    reader = _counting_reader(calls)
+    cache.cached(source, reader)
+
+    # Same size, newer mtime
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    cache.cached(source, reader)
+    assert len(calls) == 2
+
+    # Other size
+    with open(source, 'a') as file:
+        file.write('3.0\n')
+    assert cache.cached(source, reader)['Close'].tolist() == [1.0, 2.0, 3.0]
+    assert len(calls) == 3
+    # Only the copy of the current source is kept
+    assert _cached_files(source) == [cache.cache_path(source)]
+
+
+def test_invalidate_and_refresh(source):
+    calls = []
+    reader = _counting_reader(calls)
+    cache.cached(source, reader, key='a')
+    cache.cached(source, reader, key='b')
+    assert len(_cached_files(source)) == 2
+
+    cache.invalidate(source, key='a')
+    assert _cached_files(source) == [cache.cache_path(source, key='b')]
+    cache.cached(source, reader, key='b')
+    assert len(calls) == 2
+
+    cache.refresh(source, reader, key='b')
+    assert len(calls) == 3
+    cache.invalidate(source)
+    assert _cached_files(source) == []
+
+
+def test_unwritable_cache_falls_back_to_parsing(source, monkeypatch):
+    def read_only(*args, **options):
+        raise PermissionError("Read-only file system")
+
+    calls = []
+    monkeypatch.setattr(cache.os, 'makedirs', read_only)
+    assert cache.cached(source, _counting_reader(calls))['Close'].tolist() == [1.0, 2.0]
+    monkeypatch.undo()
+
+    monkeypatch.setattr(pd.DataFrame, 'to_parquet', read_only)
+    assert cache.cached(source, _counting_reader(calls))['Close'].tolist() == [1.0, 2.0]
+    assert len(calls) == 2 and _cached_files(source) == []
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from decimate import decimate_line, decimate_ohlc, lttb
+
+
+def _line(length=5_000, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2024-01-01', periods=length, freq='min')
+    return pd.Series(100 + np.cumsum(rng.normal(0, 1, length)), index=index, name='Close')
+
+
+@pytest.mark.parametrize('max_points', [3, 10, 500, 4_999])
+def test_lttb_keeps_the_ends_and_the_point_count(max_points):
+    series = _line()
+    x = np.arange(len(series))
+    selected = lttb(x, series.to_numpy(), max_points)
+    assert len(selected) == max_points
+    assert selected[0] == 0 and selected[-1] == len(series) - 1
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_keeps_short_lines():
+    assert lttb(np.arange(5), np.arange(5.), 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_decimated_line_keeps_the_extremes_and_missing_breaks():
+    series = _line()
+    series.iloc[1_000:1_100] = np.nan
+    series.iloc[3_000] = np.nan
+    decimated = decimate_line(series, 200)
+    assert len(decimated) <= 200 + 4
+    assert decimated.index.is_monotonic_increasing
+    assert decimated.max() == series.max() and decimated.min() == series.min()
+    assert decimated.index[0] == series.index[0] and decimated.index[-1] == series.index[-1]
+    # One point of every run of missing values stays, so the chart still breaks there
+    assert decimated.index[decimated.isna()].tolist() == [series.index[1_000], series.index[3_000]]
+
+
+def test_short_lines_are_not_changed():
+    series = _line(100)
+    series.iloc[[10, 11, 50]] = np.nan
+    pd.testing.assert_series_equal(decimate_line(series, 200), series)
+    pd.testing.assert_series_equal(decimate_line(series, None), series)
+
+
+@pytest.mark.parametrize('max_points', [7, 100, 999])
+def test_merged_candles_keep_prices_and_volume(max_points):
+    close = _line(1_000)
+    rng = np.random.default_rng(1)
+    data = pd.DataFrame({'Open': close.shift(1).fillna(100), 'High': close + rng.uniform(0, 1, len(close)),
+                         'Low': close - rng.uniform(0, 1, len(close)), 'Close': close,
+                         'Volume': rng.integers(1, 100, len(close)), 'OBV': np.arange(len(close))})
+    merged = decimate_ohlc(data, max_points)
+    assert len(merged) == max_points
+    assert merged['High'].max() == data['High'].max() and merged['Low'].min() == data['Low'].min()
+    assert merged['Volume'].sum() == data['Volume'].sum()
+    assert merged['Open'].iloc[0] == data['Open'].iloc[0] and merged['Close'].iloc[-1] == data['Close'].iloc[-1]
+    assert merged['OBV'].iloc[-1] == len(close) - 1
+
+    # Every candle covers its bars from its own start to the next candle's start
+    starts = data.index.get_indexer(merged.index)
+    for start, end, high, low in zip(starts, np.append(starts[1:], len(data)), merged['High'], merged['Low']):
+        assert high == data['High'].iloc[start:end].max() and low == data['Low'].iloc[start:end].min()
+    assert decimate_ohlc(data, 1_000) is data
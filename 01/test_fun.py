@@ -0,0 +1,82 @@
+import os
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+from matplotlib.axes import Axes
+
+import fun
+import store
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+def test_chunks_keep_their_dtypes(tmp_path):
+    # The first chunk only has whole prices and the second a missing volume, inferred dtypes would differ
+    path = tmp_path / 'ticks.csv'
+    path.write_text('"Date","Time","Open","High","Low","Close","Up","Down"\n'
+                    '01/05/2018,05:31:00,316,317,315,316,100,200\n'
+                    '01/05/2018,05:31:01,316,317,315,316,100,200\n'
+                    '01/05/2018,05:31:02,316.5,317.25,315.5,316.75,,200\n')
+    chunks = list(fun.read_csv_chunks(str(path), chunk_size=2))
+    assert [chunk.dtypes.tolist() for chunk in chunks] == [[np.float32] * 6] * 2
+    assert [chunk.dtypes.tolist() for chunk in fun.read_csv_chunks(str(path), downcast=False)] == [[np.float64] * 6]
+
+    assert fun.ingest_csv(str(path), str(tmp_path / 'store'), chunk_size=2) == 3
+    stored = store.OHLCVStore(str(tmp_path / 'store')).frame()
+    assert stored['Close'].tolist() == [316, 316, 316.75]
+    assert np.isnan(stored['Up'].iloc[-1]) and stored['Down'].tolist() == [200] * 3
+
+
+@pytest.mark.parametrize('file_name', ['one_minute_tsla.csv', '100_tick_tsla.csv', 'day_tsla.csv'])
+def test_time_format_is_inferred(file_name):
+    path = os.path.join(DATA_DIR, file_name)
+    data = next(fun.read_csv_chunks(path))
+    expected = fun.load_data(path, date_col='Date', time_col='Time', use_cache=False)
+    assert data.index.equals(expected.index.rename('DateTime'))
+
+
+def test_volumes_are_kept_exactly():
+    for file_name, columns in [('100_tick_tsla.csv', {'Up': np.float32, 'Down': np.float32}),
+                               ('day_tsla.csv', {'Vol': np.float64, 'OI': np.float64})]:
+        path = os.path.join(DATA_DIR, file_name)
+        data = pd.concat(fun.read_csv_chunks(path))
+        expected = pd.read_csv(path)
+        for column, dtype in columns.items():
+            assert data[column].dtype == dtype
+            np.testing.assert_array_equal(data[column].astype(np.int64), expected[column])
+
+
+def test_explicit_time_format_must_match():
+    with pytest.raises(ValueError):
+        next(fun.read_csv_chunks(os.path.join(DATA_DIR, 'one_minute_tsla.csv'), time_format='%H:%M:%S'))
+
+
+def _minute_bars():
+    index = pd.DatetimeIndex(['2024-01-02 09:30', '2024-01-02 09:31', '2024-01-02 09:40', '2024-01-02 09:41',
+                              '2024-01-02 12:00', '2024-01-02 12:03'])
+    return pd.DataFrame({'Open': 1.0, 'High': 2.0, 'Low': 0.5, 'Close': 1.5, 'Volume': 10}, index=index)
+
+
+def test_biggest_gaps_come_from_find_gaps(capsys):
+    data = _minute_bars()
+    original = data.copy()
+    gaps = fun.find_and_print_biggest_gaps(data, gap_number=2)
+    pd.testing.assert_frame_equal(data, original)
+    pd.testing.assert_frame_equal(gaps, fun.find_gaps(data, top=None))
+    assert gaps['length'].tolist() == [pd.Timedelta('139min'), pd.Timedelta('9min'), pd.Timedelta('3min')]
+    output = capsys.readouterr().out
+    assert '1. Gap Length: 0 days 02:19:00' in output and '3. Gap Length' not in output
+
+
+def test_gaps_are_shaded_from_start_to_end(monkeypatch):
+    plt.switch_backend('Agg')
+    monkeypatch.setattr(plt, 'show', lambda: None)
+    spans = []
+    monkeypatch.setattr(Axes, 'axvspan', lambda ax, start, end, **options: spans.append((start, end)))
+    data = _minute_bars()
+    gaps = fun.find_gaps(data, top=None)
+    fun.visualize_gaps_with_candlestick(data, gaps)
+    plt.close('all')
+    assert spans == list(zip(gaps['start'], gaps['end']))
@@ -1,4 +1,12 @@
+import math
+import operator
+
 import mplfinance as mpf
+import numpy as np
+
+import decimate
+import indicator_graph
+import instrument
 
 
 # How Do You Calculate the Accumulation Distribution Line?
@@ -15,6 +23,7 @@ def money_flow_volume(mfm, volume):
     return mfm * volume
 
 
+@instrument.timed()
 def accumulation_distribution_line(data):
     money_flow_mult = money_flow_multiplier(data['Close'],
                                             data['Low'],
@@ -24,18 +33,128 @@ def accumulation_distribution_line(data):
     return money_flow_vol.cumsum()
 
 
-def chaikin_oscillator(data):
+@instrument.timed()
+def chaikin_oscillator(data, short_span=3, long_span=10):
+    short_ema = f'{short_span} day EMA of ADL'
+    long_ema = f'{long_span} day EMA of ADL'
     data['ADL'] = accumulation_distribution_line(data)
     # Exponential Moving Average Formula: EMA = (Close - EMA(previous day)) * (2/(span+1)) + EMA(previous day)
-    data['3 day EMA of ADL'] = data['ADL'].ewm(span=3).mean()
-    data['10 day EMA of ADL'] = data['ADL'].ewm(span=10).mean()
-    data['CHO'] = data['3 day EMA of ADL'] - data['10 day EMA of ADL']
+    data[short_ema] = data['ADL'].ewm(span=short_span).mean()
+    data[long_ema] = data['ADL'].ewm(span=long_span).mean()
+    data['CHO'] = data[short_ema] - data[long_ema]
     return data
 
 
-def plot_chaikin(csv_data, start_date, end_date, figure_title):
-    data_cho = chaikin_oscillator(csv_data)
-    plot_data = data_cho.loc[start_date:end_date]
+def cumulative_sum(values):
+    return values.cumsum()
+
+
+def exponential_moving_average(values, span):
+    return values.ewm(span=span).mean()
+
+
+# The same indicators as nodes of the indicator graph, computed once and shared by everything that uses them
+MFM = indicator_graph.Node('MFM', money_flow_multiplier, ['Close', 'Low', 'High'])
+MFV = indicator_graph.Node('MFV', money_flow_volume, [MFM, 'Volume'])
+ADL = indicator_graph.Node('ADL', cumulative_sum, [MFV])
+
+
+def ema_node(source, span):
+    return indicator_graph.Node('EMA', exponential_moving_average, [source], span=span)
+
+
+def chaikin_node(short_span=3, long_span=10):
+    return indicator_graph.Node('CHO', operator.sub, [ema_node(ADL, short_span), ema_node(ADL, long_span)])
+
+
+def chaikin_columns(short_span=3, long_span=10):
+    """
+    Graph nodes of the columns chaikin_oscillator adds.
+    """
+    return {'ADL': ADL,
+            f'{short_span} day EMA of ADL': ema_node(ADL, short_span),
+            f'{long_span} day EMA of ADL': ema_node(ADL, long_span),
+            'CHO': chaikin_node(short_span, long_span)}
+
+
+# Streaming versions of the indicators above. Every update() is O(1) and produces the
+# same values as the pandas functions when fed the same bars in order.
+
+class ExponentialMovingAverage:
+    # Same recurrence as pandas ewm(span=span).mean() with adjust=True
+    def __init__(self, span):
+        self.alpha = 1. / (1. + (span - 1) / 2.)
+        self.old_weight_factor = 1. - self.alpha
+        self.weighted = math.nan
+        self.old_weight = 1.
+
+    def warm_up(self, values):
+        for value in np.asarray(values, dtype=float).tolist():
+            self.update(value)
+        return self.weighted
+
+    def update(self, value):
+        if self.weighted == self.weighted:
+            self.old_weight *= self.old_weight_factor
+            if value == value:
+                if self.weighted != value:
+                    self.weighted = (self.old_weight * self.weighted + value) / (self.old_weight + 1.)
+                self.old_weight += 1.
+        elif value == value:
+            self.weighted = value
+            self.old_weight = 1.
+        return self.weighted
+
+
+class AccumulationDistributionLine:
+    def __init__(self, adl=0.):
+        self.adl = adl
+
+    def update(self, close, low, high, volume):
+        money_flow_vol = money_flow_volume(money_flow_multiplier(close, low, high), volume)
+        # Same as cumsum(): a missing money flow volume gives a missing ADL but keeps the total
+        if money_flow_vol != money_flow_vol:
+            return math.nan
+        self.adl += money_flow_vol
+        return self.adl
+
+
+class ChaikinOscillator:
+    def __init__(self, short_span=3, long_span=10):
+        self.short_span = short_span
+        self.long_span = long_span
+        self.adl = AccumulationDistributionLine()
+        self.short_ema = ExponentialMovingAverage(short_span)
+        self.long_ema = ExponentialMovingAverage(long_span)
+
+    def warm_up(self, data):
+        data = chaikin_oscillator(data, self.short_span, self.long_span)
+        adl = data['ADL'].to_numpy(dtype=float)
+        observed = adl[~np.isnan(adl)]
+        self.adl.adl = observed[-1] if observed.size else 0.
+        self.short_ema.warm_up(adl)
+        self.long_ema.warm_up(adl)
+        return data
+
+    @instrument.timed()
+    def update(self, bar):
+        # NumPy scalars give NaN instead of ZeroDivisionError when High == Low, like the pandas path
+        with np.errstate(divide='ignore', invalid='ignore'):
+            adl = float(self.adl.update(np.float64(bar['Close']), np.float64(bar['Low']),
+                                        np.float64(bar['High']), np.float64(bar['Volume'])))
+        short_ema = self.short_ema.update(adl)
+        long_ema = self.long_ema.update(adl)
+        return {'ADL': adl,
+                f'{self.short_span} day EMA of ADL': short_ema,
+                f'{self.long_span} day EMA of ADL': long_ema,
+                'CHO': short_ema - long_ema}
+
+
+@instrument.timed()
+def plot_chaikin(csv_data, start_date, end_date, figure_title, max_points=2000):
+    data_cho = indicator_graph.with_columns(csv_data, chaikin_columns())
+    # Long ranges are merged into at most max_points candles before drawing
+    plot_data = decimate.decimate_ohlc(data_cho.loc[start_date:end_date], max_points)
 
     apds = [mpf.make_addplot(plot_data['ADL'], color='g', panel=1, ylabel='ADL'),
             mpf.make_addplot(plot_data['3 day EMA of ADL'], color='r', panel=1),
@@ -0,0 +1,147 @@
+import collections
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+# Indicators as a graph of nodes: every node is a function of columns of the data and of other nodes,
+# e.g. CHO = EMA(ADL, 3) - EMA(ADL, 10) with ADL = cumsum(MFV) and MFV = MFM * Volume.
+# A node is computed once per input data and parameters: its key is a hash of the content of the columns it
+# depends on and of the parameters on the way there, so CHO and both EMAs share one ADL, and the same
+# indicator is not computed again for another chart of the same data.
+
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+
+def content_hash(values):
+    """
+    Hash of the content of an array, Series or Index, the same for equal values of the same dtype.
+    """
+    values = np.asarray(values)
+    if values.dtype.hasobject:
+        values = pd.util.hash_array(values.ravel())
+    digest = hashlib.sha1(f"{values.dtype.str}{values.shape}".encode())
+    digest.update(np.ascontiguousarray(values).view(np.uint8))
+    return digest.hexdigest()
+
+
+class Node:
+    """
+    One indicator of the graph, function(*inputs, **params) where the inputs are column names of the data
+    or other nodes. Nodes built the same way are the same node, e.g. two ema_node(ADL, 3) share their values.
+    """
+
+    def __init__(self, name, function, inputs, **params):
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.params = params
+        self.signature = (name, f"{function.__module__}.{function.__qualname__}", tuple(sorted(params.items())))
+
+    def __repr__(self):
+        arguments = [input if isinstance(input, str) else repr(input) for input in self.inputs]
+        arguments += [f"{name}={value}" for name, value in sorted(self.params.items())]
+        return f"{self.name}({', '.join(arguments)})"
+
+
+def _nbytes(value):
+    # The index is shared with the data, only the values count against the budget
+    return value.to_numpy().nbytes if isinstance(value, (pd.Series, pd.DataFrame)) else np.asarray(value).nbytes
+
+
+class IndicatorCache:
+    """
+    Least recently used node values, dropped oldest first once they take more than max_bytes.
+    Values are shared with every caller and must not be modified.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            instrument.count('graph.miss')
+            return None
+        self.hits += 1
+        instrument.count('graph.hit')
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, dropped) = self.entries.popitem(last=False)
+            self.bytes -= dropped
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+
+CACHE = IndicatorCache()
+
+
+def evaluate(data, nodes, cache=CACHE):
+    """
+    Values of the nodes for the data, as a list in the same order. Only nodes missing from the cache are
+    computed, and every node is computed at most once per call even when the cache is too small to keep it.
+
+    data: DataFrame with the columns the nodes depend on
+    nodes: Node objects, or column names of the data
+    cache: IndicatorCache shared between calls, or None to share values only within this call
+    """
+    index_key = content_hash(data.index)
+    keys = {}
+    values = {}
+
+    def key_of(node):
+        if isinstance(node, str):
+            if node not in keys:
+                keys[node] = hashlib.sha1(f"{index_key}{content_hash(data[node])}".encode()).hexdigest()
+            return keys[node]
+        if id(node) not in keys:
+            keys[id(node)] = hashlib.sha1(repr((node.signature, [key_of(input) for input in node.inputs]))
+                                          .encode()).hexdigest()
+        return keys[id(node)]
+
+    def value_of(node):
+        if isinstance(node, str):
+            return data[node]
+        key = key_of(node)
+        if key in values:
+            return values[key]
+        value = cache.get(key) if cache is not None else None
+        if value is None:
+            inputs = [value_of(input) for input in node.inputs]
+            with instrument.stage(f"graph.{node.name}"):
+                value = node.function(*inputs, **node.params)
+            if cache is not None:
+                cache.put(key, value)
+        values[key] = value
+        return value
+
+    return [value_of(node) for node in nodes]
+
+
+def with_columns(data, columns, cache=CACHE):
+    """
+    Copy of the data with a column per node, e.g. with_columns(data, {'OBV': OBV}). The data is not modified.
+    """
+    return data.assign(**dict(zip(columns, evaluate(data, list(columns.values()), cache))))
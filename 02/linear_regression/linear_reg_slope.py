@@ -1,22 +1,141 @@
+import math
+
 import mplfinance as mpf
 import numpy as np
+import pandas as pd
+
+import decimate
+import indicator_graph
+import instrument
+
+# Closed form of the least squares slope over a window of w points with x = 0..w-1:
+# 1. Sxx = w * (w^2 - 1) / 12
+# 2. Sxy = sum(j * y_j) - mean(j) * sum(y_j)
+# 3. Slope = Sxy / Sxx
+# sum(y_j) and sum(j * y_j) come from two cumulative sums, so every window costs O(1).
+
+# The running sums are restarted every block so that j * y stays small and the
+# differences of the cumulative sums do not lose precision on long series.
+SLOPE_BLOCK_SIZE = 4096
+
+
+@instrument.timed()
+def rolling_slopes(values, windows, block_size=SLOPE_BLOCK_SIZE):
+    y = np.asarray(values, dtype=float)
+    windows = np.atleast_1d(np.asarray(windows, dtype=int))
+    if windows.min() < 2:
+        raise ValueError("Regression window must be at least 2 bars long")
+
+    n = len(y)
+    slopes = np.full((len(windows), n), np.nan)
+    longest = windows.max()
+
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        # Include enough history before the block for the longest window
+        first = max(start - longest + 1, 0)
+        segment = y[first:stop]
+        missing = np.isnan(segment)
+        # Centre the segment around zero: the slope does not depend on the price level
+        level = segment[~missing].mean() if not missing.all() else 0.0
+        segment = np.where(missing, 0.0, segment - level)
+        positions = np.arange(len(segment), dtype=float)
+
+        sum_y = np.concatenate(([0.0], np.cumsum(segment)))
+        sum_jy = np.concatenate(([0.0], np.cumsum(positions * segment)))
+        sum_missing = np.concatenate(([0], np.cumsum(missing)))
+
+        ends = np.arange(start, stop)
+        for row, window in enumerate(windows):
+            full = ends >= window - 1
+            end = ends[full] - first + 1
+            window_y = sum_y[end] - sum_y[end - window]
+            window_jy = sum_jy[end] - sum_jy[end - window]
+            mean_j = end - (window + 1) / 2
+            slope = (window_jy - mean_j * window_y) / (window * (window * window - 1) / 12)
+            # Windows with a missing value have no slope, same as rolling().apply()
+            slope[sum_missing[end] - sum_missing[end - window] > 0] = np.nan
+            slopes[row, start:stop][full] = slope
 
+    return slopes
 
+
+@instrument.timed()
 def linear_regression_slope(data, window=20):
-    indices = np.arange(window)
+    slopes = rolling_slopes(data.to_numpy(), [window])[0]
+    return pd.Series(slopes, index=data.index, name=data.name)
+
+
+@instrument.timed()
+def linear_regression_slopes(data, windows):
+    # One column per window, computed from the same pass over the series
+    slopes = rolling_slopes(data.to_numpy(), windows)
+    return pd.DataFrame(slopes.T, index=data.index, columns=list(windows))
+
+
+def slope_node(window=20, source='Close'):
+    # linear_regression_slope as a node of the indicator graph
+    return indicator_graph.Node('LRS', linear_regression_slope, [source], window=window)
+
+
+class RollingSlope:
+    # Streaming linear_regression_slope: keeps the last window values and the sums of the closed form,
+    # so every update() is O(1). The sums are rebuilt from the kept values once per window updates,
+    # which stops rounding errors from building up on endless streams.
+    def __init__(self, window=20):
+        if window < 2:
+            raise ValueError("Regression window must be at least 2 bars long")
+        self.window = window
+        self.values = [0.0] * window
+        self.missing = [True] * window
+        self.missing_count = window
+        self.count = 0
+        self.level = None
+        self.sum_y = 0.
+        self.sum_jy = 0.
+        self.mean_j = (window - 1) / 2
+        self.sum_xx = window * (window * window - 1) / 12
+
+    def warm_up(self, values):
+        slope = math.nan
+        for value in np.asarray(values, dtype=float).tolist():
+            slope = self.update(value)
+        return slope
+
+    def update(self, value):
+        position = self.count % self.window
+        # A NumPy value would make missing a NumPy bool, which cannot be subtracted below
+        value = float(value)
+        missing = value != value
+        if self.level is None and not missing:
+            # Values are kept relative to the first one: the slope does not depend on the price level
+            self.level = value
+        value = 0. if missing else value - self.level
+        old = self.values[position]
 
-    def slope(y_window):
-        x = indices
-        y = y_window
-        m = ((np.mean(x) * np.mean(y)) - np.mean(x * y)) / ((np.mean(x) ** 2) - np.mean(x * x))
-        return m
+        # The window y_0..y_(w-1) becomes y_1..y_w, every position moves down by one
+        self.sum_jy += (self.window - 1) * value - self.sum_y + old
+        self.sum_y += value - old
+        self.missing_count += missing - self.missing[position]
+        self.values[position] = value
+        self.missing[position] = missing
+        self.count += 1
 
-    return data.rolling(window=window).apply(slope)
+        if self.count % self.window == 0:
+            # The oldest value is back at position 0
+            self.sum_y = math.fsum(self.values)
+            self.sum_jy = math.fsum(j * y for j, y in enumerate(self.values))
+        # Windows with a missing value have no slope, same as rolling_slopes
+        if self.missing_count:
+            return math.nan
+        return (self.sum_jy - self.mean_j * self.sum_y) / self.sum_xx
 
 
-def plot_linear_regression(csv_data, start_date, end_date, figure_title):
-    csv_data['LRS'] = linear_regression_slope(csv_data['Close'], window=20)
-    plot_data = csv_data.loc[start_date:end_date]
+@instrument.timed()
+def plot_linear_regression(csv_data, start_date, end_date, figure_title, window=20, max_points=2000):
+    data_with_lrs = indicator_graph.with_columns(csv_data, {'LRS': slope_node(window)})
+    # Long ranges are merged into at most max_points candles before drawing
+    plot_data = decimate.decimate_ohlc(data_with_lrs.loc[start_date:end_date], max_points)
 
     # Create a color list based on the sign of the LRS values
     colors = ['green' if val > 0 else 'red' for val in plot_data['LRS']]
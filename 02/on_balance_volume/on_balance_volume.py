@@ -1,4 +1,10 @@
 import mplfinance as mpf
+import numpy as np
+import pandas as pd
+
+import decimate
+import indicator_graph
+import instrument
 
 # Formula for On Balance Volume (OBV)
 # 1. If the closing price is higher than the previous closing price, then:
@@ -8,26 +14,59 @@ import mplfinance as mpf
 # 3. If the closing price is equal to the previous closing price, then:
 #    OBV = Previous OBV
 
+def on_balance_volume_values(close, volume):
+    close = np.asarray(close)
+    volume = np.asarray(volume)
+    # +1 when the close went up, -1 when it went down, 0 when unchanged (or missing)
+    direction = np.zeros(len(close), dtype=int)
+    direction[1:] = (close[1:] > close[:-1]).astype(int) - (close[1:] < close[:-1]).astype(int)
+    # Unchanged closes keep the OBV even when their volume is missing
+    return np.cumsum(np.where(direction == 0, 0, direction * volume))
+
+
+@instrument.timed()
 def on_balance_volume(data):
-    # Initialize OBV value
-    obv = [0]
-    # Using vectorized approach to calculate OBV
-    for i in range(1, len(data)):
-        # If the closing price is higher than the previous closing price
-        if data['Close'].iloc[i] > data['Close'].iloc[i - 1]:
-            obv.append(obv[-1] + data['Volume'].iloc[i])  # Add the current volume to the previous OBV value
-        elif data['Close'].iloc[i] < data['Close'].iloc[i - 1]:
-            obv.append(obv[-1] - data['Volume'].iloc[i])  # Subtract the current volume from the previous OBV value
-        else:
-            obv.append(obv[-1])
-
-    data['OBV'] = obv
+    data['OBV'] = on_balance_volume_values(data['Close'].to_numpy(), data['Volume'].to_numpy())
     return data
 
 
-def plot_on_balance_vol(csv_data, start_date, end_date, figure_title):
-    data_with_obv = on_balance_volume(csv_data)
-    plot_data = data_with_obv.loc[start_date:end_date]
+def on_balance_volume_series(close, volume):
+    return pd.Series(on_balance_volume_values(close.to_numpy(), volume.to_numpy()), index=close.index, name='OBV')
+
+
+# On Balance Volume as a node of the indicator graph
+OBV = indicator_graph.Node('OBV', on_balance_volume_series, ['Close', 'Volume'])
+
+
+class OnBalanceVolume:
+    # Keeps the last close and OBV value so that new bars are added in O(1)
+    def __init__(self, last_close=None, obv=0):
+        self.last_close = last_close
+        self.obv = obv
+
+    @classmethod
+    def from_frame(cls, data):
+        if data.empty:
+            return cls()
+        obv = on_balance_volume_values(data['Close'].to_numpy(), data['Volume'].to_numpy())
+        return cls(data['Close'].iloc[-1], obv[-1])
+
+    @instrument.timed()
+    def update(self, close, volume):
+        if self.last_close is not None:
+            if close > self.last_close:
+                self.obv += volume
+            elif close < self.last_close:
+                self.obv -= volume
+        self.last_close = close
+        return self.obv
+
+
+@instrument.timed()
+def plot_on_balance_vol(csv_data, start_date, end_date, figure_title, max_points=2000):
+    data_with_obv = indicator_graph.with_columns(csv_data, {'OBV': OBV})
+    # Long ranges are merged into at most max_points candles before drawing
+    plot_data = decimate.decimate_ohlc(data_with_obv.loc[start_date:end_date], max_points)
 
     obv_plot = mpf.make_addplot(plot_data['OBV'], panel=2, color='fuchsia', ylabel='OBV')
 
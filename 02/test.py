@@ -1,5 +1,12 @@
+import os
+import sys
+
 import pandas as pd
 
+# cache, decimate and instrument are imported from lab 1
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '01'))
+
+import cache
 import chaikin.chaikin_oscillator as cho
 import linear_regression.linear_reg_slope as lrs
 import on_balance_volume.on_balance_volume as obv
@@ -8,14 +15,18 @@ data_file_name = '../data/eurusd_m1_data.csv'
 date_format = "%Y.%m.%d %H:%M:%S"
 
 
-def read_csv():
-    data = pd.read_csv(data_file_name)
+def parse_csv(file_name):
+    data = pd.read_csv(file_name)
     data['Time'] = pd.to_datetime(data['Time'], format=date_format)
     data = data.set_index('Time')
     data = data.iloc[::-1]  # Reverse the data to have it in ascending order
     return data
 
 
+def read_csv():
+    return cache.cached(data_file_name, parse_csv, key=('read_csv', date_format))
+
+
 csv_data = read_csv()
 
 # Trend confirmation: The Chaikin Oscillator can help traders confirm the strength and direction of existing trends.
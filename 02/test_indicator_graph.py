@@ -0,0 +1,75 @@
+import pandas as pd
+
+import indicator_graph
+from chaikin.chaikin_oscillator import ADL, chaikin_columns, chaikin_node, chaikin_oscillator, ema_node
+from indicator_graph import IndicatorCache, Node, evaluate, with_columns
+from linear_regression.linear_reg_slope import linear_regression_slope, slope_node
+from on_balance_volume.on_balance_volume import OBV, on_balance_volume
+
+
+def test_columns_match_the_functions(ohlcv_bars):
+    data = ohlcv_bars()
+    original = data.copy()
+    columns = dict(chaikin_columns(), OBV=OBV, LRS=slope_node(20))
+    result = with_columns(data, columns, cache=IndicatorCache())
+    pd.testing.assert_frame_equal(data, original)
+
+    expected = chaikin_oscillator(data.copy())
+    for column in chaikin_columns():
+        pd.testing.assert_series_equal(result[column], expected[column], check_names=False)
+    pd.testing.assert_series_equal(result['OBV'], on_balance_volume(data.copy())['OBV'], check_names=False,
+                                   check_dtype=False)
+    pd.testing.assert_series_equal(result['LRS'], linear_regression_slope(data['Close'], 20), check_names=False)
+
+
+def test_shared_nodes_are_computed_once(ohlcv_bars):
+    data = ohlcv_bars()
+    cache = IndicatorCache()
+    # MFM, MFV, ADL, both EMAs and CHO, the EMAs built again by chaikin_node are the same nodes
+    evaluate(data, [chaikin_node(), ema_node(ADL, 3), ADL], cache)
+    assert (cache.misses, len(cache)) == (6, 6)
+
+    first = evaluate(data, [chaikin_node()], cache)[0]
+    assert cache.misses == 6 and cache.hits == 1
+    assert evaluate(data.copy(), [chaikin_node()], cache)[0] is first
+
+    # Other values or parameters are other keys, MFM does not depend on the volume
+    changed = data.copy()
+    changed.iloc[-1, changed.columns.get_loc('Volume')] += 1
+    evaluate(changed, [chaikin_node()], cache)
+    evaluate(data, [chaikin_node(5, 20)], cache)
+    assert cache.misses == 6 + 5 + 3
+
+
+def test_least_recently_used_values_are_dropped(ohlcv_bars):
+    data = ohlcv_bars(100)
+    calls = []
+
+    def scaled(values, factor):
+        calls.append(factor)
+        return values * factor
+
+    nodes = {factor: Node('Scaled', scaled, ['Close'], factor=factor) for factor in range(4)}
+    size = data['Close'].to_numpy().nbytes
+    cache = IndicatorCache(max_bytes=2 * size)
+    evaluate(data, [nodes[0], nodes[1]], cache)
+    evaluate(data, [nodes[0]], cache)
+    evaluate(data, [nodes[2]], cache)
+    assert cache.bytes == 2 * size and len(cache) == 2
+
+    # Factor 1 was used least recently and is computed again
+    evaluate(data, [nodes[0], nodes[2], nodes[1]], cache)
+    assert calls == [0, 1, 2, 1]
+
+    # A value larger than the whole cache is never kept, but still shared within one call
+    small = IndicatorCache(max_bytes=size - 1)
+    first, second = evaluate(data, [nodes[3], nodes[3]], small)
+    assert first is second and len(small) == 0
+
+
+def test_without_a_cache_nothing_is_kept(ohlcv_bars):
+    data = ohlcv_bars()
+    before = len(indicator_graph.CACHE)
+    values = evaluate(data, [chaikin_node(), 'Close'], cache=None)
+    assert len(indicator_graph.CACHE) == before
+    pd.testing.assert_series_equal(values[1], data['Close'])
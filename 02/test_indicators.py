@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from chaikin.chaikin_oscillator import (AccumulationDistributionLine, ChaikinOscillator, ExponentialMovingAverage,
+                                        accumulation_distribution_line, chaikin_oscillator)
+from linear_regression.linear_reg_slope import linear_regression_slope, linear_regression_slopes, rolling_slopes
+from on_balance_volume.on_balance_volume import OnBalanceVolume, on_balance_volume, on_balance_volume_values
+
+
+def _loop_on_balance_volume(data):
+    # The original row by row OBV
+    obv = [0]
+    for i in range(1, len(data)):
+        if data['Close'].iloc[i] > data['Close'].iloc[i - 1]:
+            obv.append(obv[-1] + data['Volume'].iloc[i])
+        elif data['Close'].iloc[i] < data['Close'].iloc[i - 1]:
+            obv.append(obv[-1] - data['Volume'].iloc[i])
+        else:
+            obv.append(obv[-1])
+    return np.array(obv, dtype=float)
+
+
+def test_on_balance_volume_matches_the_loop(ohlcv_bars):
+    data = ohlcv_bars()
+    np.testing.assert_array_equal(on_balance_volume(data.copy())['OBV'], _loop_on_balance_volume(data))
+
+
+def test_missing_volume_on_an_unchanged_close_keeps_the_obv():
+    close = np.array([1.0, 2.0, 2.0, 1.0, 3.0])
+    volume = np.array([5.0, 10.0, np.nan, 4.0, 1.0])
+    np.testing.assert_array_equal(on_balance_volume_values(close, volume), [0, 10, 10, 6, 7])
+    data = pd.DataFrame({'Close': close, 'Volume': volume})
+    np.testing.assert_array_equal(on_balance_volume_values(close, volume), _loop_on_balance_volume(data))
+
+
+def test_streaming_on_balance_volume_matches_batch(ohlcv_bars):
+    data = ohlcv_bars()
+    data.iloc[100, data.columns.get_loc('Volume')] = np.nan
+    data.iloc[100, data.columns.get_loc('Close')] = data['Close'].iloc[99]
+    batch = on_balance_volume_values(data['Close'].to_numpy(), data['Volume'].to_numpy())
+    streaming = OnBalanceVolume()
+    np.testing.assert_array_equal([streaming.update(close, volume) for close, volume in
+                                   zip(data['Close'].tolist(), data['Volume'].tolist())], batch)
+    # Continuing from a frame gives the same values as streaming from the start
+    resumed = OnBalanceVolume.from_frame(data.iloc[:300])
+    np.testing.assert_array_equal([resumed.update(close, volume) for close, volume in
+                                   zip(data['Close'].tolist()[300:], data['Volume'].tolist()[300:])], batch[300:])
+
+
+def _rolling_apply_slope(values, window):
+    # The original rolling().apply() slope
+    x = np.arange(window)
+
+    def slope(y):
+        return ((np.mean(x) * np.mean(y)) - np.mean(x * y)) / ((np.mean(x) ** 2) - np.mean(x * x))
+
+    return pd.Series(values).rolling(window=window).apply(slope, raw=True).to_numpy()
+
+
+@pytest.mark.parametrize('window', [2, 5, 20, 64])
+def test_rolling_slopes_match_rolling_apply(ohlcv_bars, window):
+    close = ohlcv_bars(2_000)['Close'].to_numpy() + 1_000
+    close[[50, 51, 700]] = np.nan
+    # Small blocks so that windows cross block boundaries
+    slopes = rolling_slopes(close, [window], block_size=97)[0]
+    np.testing.assert_allclose(slopes, _rolling_apply_slope(close, window), rtol=1e-7, atol=1e-9)
+
+
+def test_slope_windows_share_one_pass(ohlcv_bars):
+    close = ohlcv_bars()['Close']
+    slopes = linear_regression_slopes(close, [5, 20, 40])
+    for window in [5, 20, 40]:
+        np.testing.assert_allclose(slopes[window], linear_regression_slope(close, window), rtol=1e-12, atol=1e-12)
+    assert linear_regression_slope(close.iloc[:3], 20).isna().all()
+
+
+def test_slope_window_must_be_two_bars():
+    with pytest.raises(ValueError):
+        rolling_slopes(np.arange(10.0), [1])
+
+
+@pytest.fixture
+def chaikin_bars(ohlcv_bars):
+    data = ohlcv_bars()
+    # A bar without range has no money flow multiplier, and one bar misses its volume
+    data.iloc[10, [data.columns.get_loc(column) for column in ['High', 'Low']]] = data['Close'].iloc[10]
+    data.iloc[20, data.columns.get_loc('Volume')] = np.nan
+    return data
+
+
+@pytest.mark.parametrize('span', [1, 3, 10])
+def test_streaming_ema_matches_ewm(ohlcv_bars, span):
+    values = ohlcv_bars()['Close'].to_numpy().copy()
+    values[[0, 5, 6]] = np.nan
+    ema = ExponentialMovingAverage(span)
+    np.testing.assert_allclose([ema.update(value) for value in values.tolist()],
+                               pd.Series(values).ewm(span=span).mean(), rtol=1e-12)
+
+
+def test_streaming_adl_matches_batch(chaikin_bars):
+    data = chaikin_bars
+    adl = AccumulationDistributionLine()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        streaming = [adl.update(*(np.float64(value) for value in row))
+                     for row in data[['Close', 'Low', 'High', 'Volume']].itertuples(index=False)]
+    np.testing.assert_allclose(streaming, accumulation_distribution_line(data), rtol=1e-12)
+
+
+def test_streaming_chaikin_matches_batch(chaikin_bars):
+    data = chaikin_bars
+    batch = chaikin_oscillator(data.copy())
+    chaikin = ChaikinOscillator()
+    streaming = pd.DataFrame([chaikin.update(bar) for bar in data.to_dict('records')], index=data.index)
+    pd.testing.assert_frame_equal(streaming, batch[streaming.columns], rtol=1e-12)
+
+    # Warming up on the first bars and streaming the rest gives the same values
+    resumed = ChaikinOscillator()
+    resumed.warm_up(data.iloc[:300].copy())
+    rest = pd.DataFrame([resumed.update(bar) for bar in data.iloc[300:].to_dict('records')], index=data.index[300:])
+    pd.testing.assert_frame_equal(rest, batch[streaming.columns].iloc[300:], rtol=1e-12)
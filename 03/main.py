@@ -1,12 +1,19 @@
-import yfinance as yf
+import os
+import sys
+
 import matplotlib.pyplot as plt
+
+# The strategy and providers import instrument from lab 1
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '01'))
+
 from plot import plot_data, plot_buy_sell_comparison
+from providers import YahooProvider
 from strategy import calculate_return, optimize_strategy, bollinger_bands_strategy
 
 ticker = "AAPL"
 start_date = "2020-01-01"
 end_date = "2021-01-01"
-data = yf.download(ticker, start=start_date, end=end_date)
+data = YahooProvider().get(ticker, start_date, end_date)
 
 window = (10, 50)
 take_profit = 0.05
@@ -19,7 +26,7 @@ def main(data):
     print(f"Window: {window}")
     print(f"Strategy Return: {strategy_cumulative_return.iloc[-1]}")
 
-    optimized_data, optimized_window, optimized_cumulative_return, optimized_return = optimize_strategy(data.copy(), take_profit, stop_loss)
+    optimized_data, optimized_window, optimized_cumulative_return, optimized_return = optimize_strategy(data.copy(), take_profit, stop_loss, workers=None)
     plot_data(optimized_data.copy(), ticker, optimized_window)
     print(f"Optimized Window: {optimized_window}")
     print(f"Best Return: {optimized_cumulative_return.iloc[-1]}")
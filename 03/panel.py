@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+from strategy import exit_returns, grid_averages, moving_averages
+
+
+def align_closes(data_dict):
+    """
+    Aligns the Close prices of every ticker on one date index. Dates a ticker has no price for are NaN.
+    """
+    return pd.DataFrame({ticker: data['Close'] for ticker, data in data_dict.items() if not data.empty}).sort_index()
+
+
+def _pack(values):
+    # Moves the prices of every column to the top, in date order, so each column is one gap-free series
+    valid = ~np.isnan(values)
+    order = np.argsort(~valid, axis=0, kind='stable')
+    return np.take_along_axis(values, order, axis=0), order, valid.sum(axis=0)
+
+
+def _moving_averages(packed, counts, windows):
+    # strategy.moving_averages of the gap-free series of every ticker, so the SMAs are the same as in
+    # calculate_return. Returns the short and long SMAs with one column per (ticker, window) pair
+    lengths = grid_averages(windows)
+    sma_short = np.full((len(packed), packed.shape[1] * len(windows)), np.nan)
+    sma_long = np.full(sma_short.shape, np.nan)
+    for ticker, count in enumerate(counts):
+        averages = dict(zip(lengths, moving_averages(packed[:count, ticker], lengths)))
+        columns = slice(ticker * len(windows), (ticker + 1) * len(windows))
+        sma_short[:count, columns] = np.column_stack([averages[short] for short, _ in windows])
+        sma_long[:count, columns] = np.column_stack([averages[long] for _, long in windows])
+    return sma_short, sma_long
+
+
+def panel_backtest(closes, windows=((10, 50),), take_profit=0.05, stop_loss=0.01):
+    """
+    Runs the SMA crossover strategy with take profit and stop loss for every ticker and every window in one pass
+    over a (dates x tickers) price matrix. The returns of a ticker are the Strategy_Return of calculate_return on
+    its own bars, down to the last bit.
+    Returns the per-bar returns (NaN before a strategy has both SMAs) with (ticker, window) columns and a summary.
+    The cumulative return is NaN for a strategy that never has both SMAs.
+
+    closes: DataFrame of Close prices, one column per ticker (see align_closes). A NaN is a date without a bar,
+            so a ticker's own missing prices are skipped like dates it does not trade on
+    windows: (short, long) SMA windows, every ticker is tested with each of them
+    """
+    tickers = list(closes.columns)
+    windows = [tuple(window) for window in windows]
+    columns = pd.MultiIndex.from_tuples([(ticker, window) for ticker in tickers for window in windows],
+                                        names=['Ticker', 'Window'])
+
+    packed, order, counts = _pack(closes.to_numpy(dtype=float))
+    sma_short, sma_long = _moving_averages(packed, counts, windows)
+    # One column per (ticker, window) pair
+    column_tickers = np.repeat(np.arange(len(tickers)), len(windows))
+    packed = packed[:, column_tickers]
+    order = order[:, column_tickers]
+    # Like data.dropna() in bollinger_bands_strategy, a strategy starts once both SMAs exist
+    active = ~np.isnan(sma_short) & ~np.isnan(sma_long)
+    signal = np.where(active, np.where(sma_short > sma_long, 1, -1), 0)
+    packed_returns, packed_exits = exit_returns(packed, signal, take_profit, stop_loss)
+
+    returns = np.full(packed.shape, np.nan)
+    np.put_along_axis(returns, order, np.where(active, packed_returns, np.nan), axis=0)
+    returns = pd.DataFrame(returns, index=closes.index, columns=columns)
+
+    summary = pd.DataFrame({
+        'Cumulative Return': returns.sum(min_count=1),
+        'Sharpe Ratio': (252 ** 0.5) * returns.mean() / returns.std(),
+        'Trades': packed_exits.sum(axis=0),
+        'Winning Trades': (packed_exits & (packed_returns > 0)).sum(axis=0),
+    }, index=columns)
+    return returns, summary
+
+
+def best_windows(summary):
+    """
+    Returns the window with the highest cumulative return for every ticker.
+    A ticker without enough bars for any window has no window and a NaN return.
+    """
+    cumulative = summary['Cumulative Return']
+    # Windows are tuples, so positions are used instead of labels of the (ticker, window) index
+    tickers = cumulative.index.get_level_values('Ticker')
+    scores = cumulative.to_numpy()
+    rows = {}
+    for ticker in tickers.unique():
+        positions = np.flatnonzero(tickers == ticker)
+        if np.isnan(scores[positions]).all():
+            rows[ticker] = (None, np.nan)
+        else:
+            best = positions[np.nanargmax(scores[positions])]
+            rows[ticker] = (cumulative.index[best][1], scores[best])
+    return pd.DataFrame.from_dict(rows, orient='index', columns=['Window', 'Cumulative Return'])
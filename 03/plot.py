@@ -1,8 +1,12 @@
 import matplotlib.pyplot as plt
 
 
-def plot_data(data, ticker, window):
-    fig, ax = plt.subplots(figsize=(14, 7))
+def plot_data(data, ticker, window, ax=None, show=True):
+    # Draws into ax when given (e.g. a cell of a report grid), otherwise into a new figure
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(14, 7))
+    else:
+        fig = ax.figure
     ax.plot(data['Close'], label='Close Price', color='green', alpha=1)
 
     if 'SMA_short' in data.columns and 'SMA_long' in data.columns:
@@ -18,7 +22,8 @@ def plot_data(data, ticker, window):
     ax.set_xlabel('Date')
     ax.set_ylabel('Price')
     ax.legend()
-    plt.show()
+    if show:
+        plt.show()
     return fig, ax
 
 
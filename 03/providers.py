@@ -0,0 +1,191 @@
+import abc
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import yfinance as yf
+
+import instrument
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+# Ticker -> file in data/ served by CsvProvider
+CSV_FILES = {
+    'TSLA': 'day_tsla.csv',
+    'EURUSD': 'eurusd_d1_data.csv',
+}
+
+
+def merge_ranges(ranges):
+    """
+    Merges overlapping or touching [start, end) ranges.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(ranges, start, end):
+    """
+    Returns the parts of [start, end) that are not inside any of the given [start, end) ranges.
+    """
+    missing = []
+    for covered_start, covered_end in merge_ranges(ranges):
+        if covered_end <= start or covered_start >= end:
+            continue
+        if covered_start > start:
+            missing.append((start, covered_start))
+        start = max(start, covered_end)
+    if start < end:
+        missing.append((start, end))
+    return missing
+
+
+def read_range_cache(path):
+    """
+    Reads the cached bars at path.parquet and the [start, end) ranges they cover from path.json.
+    Returns an empty frame and no ranges when nothing is cached yet.
+    """
+    data = pd.read_parquet(f"{path}.parquet") if os.path.exists(f"{path}.parquet") else pd.DataFrame()
+    ranges = []
+    if os.path.exists(f"{path}.json"):
+        with open(f"{path}.json") as file:
+            ranges = [(pd.Timestamp(start), pd.Timestamp(end)) for start, end in json.load(file)]
+    return data, ranges
+
+
+def write_range_cache(path, data, ranges):
+    """
+    Replaces the cache read by read_range_cache. Both files are written to a temporary file first,
+    so a crash never leaves a half written one.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data.to_parquet(f"{path}.parquet.tmp")
+    os.replace(f"{path}.parquet.tmp", f"{path}.parquet")
+    with open(f"{path}.json.tmp", 'w') as file:
+        json.dump([[start.isoformat(), end.isoformat()] for start, end in ranges], file)
+    os.replace(f"{path}.json.tmp", f"{path}.json")
+
+
+class Provider(abc.ABC):
+    """
+    Common interface of the data providers: daily OHLCV frames with a datetime index for a [start, end) range.
+    """
+
+    @abc.abstractmethod
+    def get(self, ticker, start, end):
+        pass
+
+    def get_many(self, tickers, start, end):
+        return {ticker: self.get(ticker, start, end) for ticker in tickers}
+
+
+class YahooProvider(Provider):
+    """
+    Downloads from Yahoo Finance with a local Parquet cache per ticker. Only the parts of a date range that were
+    never downloaded are fetched, and get_many fetches the tickers concurrently.
+    """
+
+    def __init__(self, cache_dir=os.path.join(DATA_DIR, '.cache', 'yahoo'), max_workers=8, download=None):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.download = download or self._download
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    @staticmethod
+    @instrument.timed('providers.download')
+    def _download(ticker, start, end):
+        data = yf.download(ticker, start=start, end=end, progress=False, auto_adjust=False)
+        if isinstance(data.columns, pd.MultiIndex):
+            data.columns = data.columns.get_level_values(0)
+        instrument.count('providers.downloaded_rows', len(data))
+        return data
+
+    def _cache_path(self, ticker):
+        return os.path.join(self.cache_dir, ticker)
+
+    def _lock(self, ticker):
+        with self.locks_lock:
+            return self.locks.setdefault(ticker, threading.Lock())
+
+    @instrument.timed()
+    def get(self, ticker, start, end):
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        with self._lock(ticker):
+            data, ranges = read_range_cache(self._cache_path(ticker))
+            missing = missing_ranges(ranges, start, end)
+            if missing:
+                fetched = [self.download(ticker, fetch_start.strftime('%Y-%m-%d'), fetch_end.strftime('%Y-%m-%d'))
+                           for fetch_start, fetch_end in missing]
+                data = pd.concat([data] + [frame for frame in fetched if not frame.empty])
+                data = data[~data.index.duplicated(keep='last')].sort_index()
+                # Today's bar is still changing, so ranges reaching today are downloaded again next time.
+                # yfinance returns an empty frame on network and ticker errors, so empty ranges are tried again too
+                today = pd.Timestamp.today().normalize()
+                ranges += [(fetch_start, min(fetch_end, today))
+                           for (fetch_start, fetch_end), frame in zip(missing, fetched)
+                           if not frame.empty and fetch_start < today]
+                # Parquet only stores string column names
+                data.columns = [str(column) for column in data.columns]
+                write_range_cache(self._cache_path(ticker), data, merge_ranges(ranges))
+
+        if data.empty:
+            return data
+        return data[(data.index >= start) & (data.index < end)]
+
+    def get_many(self, tickers, start, end):
+        tickers = list(dict.fromkeys(tickers))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            frames = executor.map(lambda ticker: self.get(ticker, start, end), tickers)
+            return dict(zip(tickers, frames))
+
+
+class CsvProvider(Provider):
+    """
+    Serves the CSV files in data/ without any network access, for offline backtests and tests.
+
+    files: Ticker -> file name in the directory
+    """
+
+    def __init__(self, directory=DATA_DIR, files=CSV_FILES):
+        self.directory = directory
+        self.files = files
+
+    def _read(self, ticker):
+        if ticker not in self.files:
+            return pd.DataFrame()
+        data = pd.read_csv(os.path.join(self.directory, self.files[ticker]), encoding='utf-8-sig')
+        if 'Date' in data.columns:
+            # day_tsla.csv style: 07/21/2017,12:00
+            data.index = pd.to_datetime(data['Date'], format='%m/%d/%Y')
+            data = data.drop(columns=['Date', 'Time', 'OI'], errors='ignore').rename(columns={'Vol': 'Volume'})
+        else:
+            # MetaTrader export style: 2019.04.08 00:00:00, newest first
+            data.index = pd.to_datetime(data['Time'], format='%Y.%m.%d %H:%M:%S')
+            data = data.drop(columns=['Time'])
+        data.index.name = 'Date'
+        return data.sort_index()
+
+    def date_range(self, tickers):
+        """
+        [start, end) range that covers every row of the files of the tickers, None when none of them has a file.
+        """
+        indexes = [self._read(ticker).index for ticker in tickers]
+        indexes = [index for index in indexes if len(index)]
+        if not indexes:
+            return None
+        return min(index[0] for index in indexes), max(index[-1] for index in indexes) + pd.Timedelta(days=1)
+
+    @instrument.timed()
+    def get(self, ticker, start, end):
+        data = self._read(ticker)
+        if data.empty:
+            return data
+        return data[(data.index >= pd.Timestamp(start)) & (data.index < pd.Timestamp(end))]
@@ -1,10 +1,29 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+
 import numpy as np
+import pandas as pd
+
+import instrument
+
+
+@instrument.timed()
+def moving_averages(close, windows):
+    # The simple moving average of every window, one row per window. Each is pandas' rolling mean: a cumulative
+    # sum is faster, but rounds near ties differently and would flip signals compared with rolling().mean()
+    close = pd.Series(np.asarray(close, dtype=float))
+    averages = np.full((len(windows), len(close)), np.nan)
+    for row, window in enumerate(windows):
+        averages[row] = close.rolling(window).mean().to_numpy()
+    return averages
 
 
+@instrument.timed()
 def bollinger_bands_strategy(data, window):
     short_window, long_window = window
-    data['SMA_short'] = data['Close'].rolling(window=short_window).mean()
-    data['SMA_long'] = data['Close'].rolling(window=long_window).mean()
+    data['SMA_short'], data['SMA_long'] = moving_averages(data['Close'], [short_window, long_window])
     data.dropna(inplace=True)
     data['Signal'] = np.where(data['SMA_short'] > data['SMA_long'], 1, -1)
     data['Buy'] = np.where((data['Signal'] == 1) & (data['Signal'].shift(1) == -1), data['Close'], np.nan)
@@ -12,60 +31,163 @@ def bollinger_bands_strategy(data, window):
     return data
 
 
+@instrument.timed()
+def exit_returns(close, signal, take_profit, stop_loss, close_at_end=False):
+    # 2D inputs hold one independent series per column; take_profit and stop_loss may be given per column.
+    # close_at_end closes the positions still open on the last bar at its price instead of leaving them out
+    close = np.asarray(close, dtype=float)
+    signal = np.asarray(signal)
+    shape = close.shape
+    # One column per series, spelled out because reshape cannot infer it for an empty series
+    close = close.reshape(len(close), int(np.prod(shape[1:])))
+    signal = signal.reshape(close.shape)
+    strategy_return = np.zeros(close.size)
+    exits = np.zeros(close.size, dtype=bool)
+    if len(close) < 2:
+        return strategy_return.reshape(shape), exits.reshape(shape)
+
+    # A position is opened when the signal crosses from -1 to 1
+    entries = np.zeros(close.shape, dtype=bool)
+    entries[1:] = (signal[1:] == 1) & (signal[:-1] == -1)
+    in_trade = np.cumsum(entries, axis=0) > 0
+    # Series are laid out one after another, so every trade of every column gets its own number
+    entries, in_trade = entries.ravel(order='F'), in_trade.ravel(order='F')
+    close, signal = close.ravel(order='F'), signal.ravel(order='F')
+    take_profit = np.repeat(np.broadcast_to(np.asarray(take_profit, dtype=float), shape[1:] or 1), shape[0])
+    stop_loss = np.repeat(np.broadcast_to(np.asarray(stop_loss, dtype=float), shape[1:] or 1), shape[0])
+    trade = np.cumsum(entries)
+    open_price = np.full(close.size, np.nan)
+    open_price[in_trade] = close[entries][trade[in_trade] - 1]
+
+    change = close / open_price - 1
+    should_take_profit = change >= take_profit
+    should_stop_loss = change <= -stop_loss
+    should_sell_signal = signal == -1
+    # The signal stays at 1 until the first -1 after an entry, so the first bar that meets any
+    # exit condition in each trade is where the position is closed
+    candidates = np.flatnonzero(in_trade & ~entries & (should_take_profit | should_stop_loss | should_sell_signal))
+    first = np.ones(len(candidates), dtype=bool)
+    first[1:] = trade[candidates[1:]] != trade[candidates[:-1]]
+    exit_index = candidates[first]
+
+    strategy_return[exit_index] = np.where(should_take_profit[exit_index], take_profit[exit_index],
+                                           np.where(should_stop_loss[exit_index], -stop_loss[exit_index],
+                                                    change[exit_index]))
+    exits[exit_index] = True
+
+    if close_at_end:
+        last = np.arange(1, close.size // shape[0] + 1) * shape[0] - 1
+        closed = np.zeros(trade[-1] + 1, dtype=bool)
+        closed[trade[exit_index]] = True
+        # The newest trade of a column is still open when it has not exited, one entered on the last bar is not held
+        still_open = last[in_trade[last] & ~entries[last] & ~closed[trade[last]]]
+        strategy_return[still_open] = change[still_open]
+        exits[still_open] = True
+    return strategy_return.reshape(shape, order='F'), exits.reshape(shape, order='F')
+
+
+@instrument.timed()
 def calculate_return(data, window, take_profit, stop_loss):
     bollinger_bands_strategy(data, window)
-    data['Strategy_Return'] = 0.0
-    position_open_price = None
-    for i in range(1, len(data)):
-        current_signal = data['Signal'].iloc[i]
-        previous_signal = data['Signal'].iloc[i - 1]
-        current_price = data['Close'].iloc[i]
-
-        if current_signal == 1 and previous_signal == -1:
-            position_open_price = current_price
-
-        elif position_open_price is not None:
-            change = (current_price / position_open_price) - 1
-            should_take_profit = change >= take_profit
-            should_stop_loss = change <= -stop_loss
-            should_sell_signal = current_signal == -1
-
-            if should_take_profit or should_stop_loss or should_sell_signal:
-                if should_take_profit:
-                    adjusted_return = take_profit
-                elif should_stop_loss:
-                    adjusted_return = -stop_loss
-                else:
-                    adjusted_return = change
-
-                data.at[data.index[i], 'Strategy_Return'] = adjusted_return
-                data.at[data.index[i], 'Sell'] = current_price
-                position_open_price = None
+    close = data['Close'].to_numpy(dtype=float)
+    strategy_return, exits = exit_returns(close, data['Signal'].to_numpy(), take_profit, stop_loss)
+    data['Strategy_Return'] = strategy_return
+    data['Sell'] = np.where(exits, close, np.nan)
 
     data['Cumulative_Strategy_Return'] = data['Strategy_Return'].cumsum()
     data['Cumulative_Strategy_Return'].dropna(inplace=True)
     return data, data['Cumulative_Strategy_Return'], data['Strategy_Return']
 
 
-def optimize_strategy(data, take_profit, stop_loss):
+def strategy_windows():
+    return [(short_window, long_window)
+            for short_window in range(5, 50, 5)
+            for long_window in range(50, 200, 5)
+            if short_window < long_window]
+
+
+@instrument.timed()
+def window_return(close, complete, sma_short, sma_long, take_profit, stop_loss):
+    # Final cumulative return of calculate_return() for one window, computed on arrays
+    # Same rows as data.dropna() in bollinger_bands_strategy
+    rows = complete & ~np.isnan(sma_short) & ~np.isnan(sma_long)
+    if not rows.any():
+        return np.nan
+    signal = np.where(sma_short[rows] > sma_long[rows], 1, -1)
+    strategy_return, _ = exit_returns(close[rows], signal, take_profit, stop_loss)
+    return np.cumsum(strategy_return)[-1]
+
+
+@instrument.timed()
+def grid_averages(windows):
+    # Every SMA length used by the grid, each computed once
+    return sorted({length for window in windows for length in window})
+
+
+# Close prices, complete-row flags and the SMA matrix shared with the worker processes
+_shared_memory = None
+_shared_prices = None
+_shared_rows = None
+
+
+def _attach_shared_prices(name, shape, lengths):
+    global _shared_memory, _shared_prices, _shared_rows
+    _shared_memory = shared_memory.SharedMemory(name=name)
+    _shared_prices = np.ndarray(shape, dtype=float, buffer=_shared_memory.buf)
+    _shared_rows = {length: row for row, length in enumerate(lengths, start=2)}
+
+
+def _shared_window_return(window, take_profit, stop_loss):
+    short_window, long_window = window
+    return window_return(_shared_prices[0], _shared_prices[1].astype(bool),
+                         _shared_prices[_shared_rows[short_window]], _shared_prices[_shared_rows[long_window]],
+                         take_profit, stop_loss)
+
+
+@instrument.timed()
+def grid_returns(data, windows, take_profit, stop_loss, workers=1):
+    close = data['Close'].to_numpy(dtype=float)
+    complete = data.notna().all(axis=1).to_numpy()
+    lengths = grid_averages(windows)
+
+    if workers == 1:
+        averages = dict(zip(lengths, moving_averages(close, lengths)))
+        return [window_return(close, complete, averages[short_window], averages[long_window], take_profit, stop_loss)
+                for short_window, long_window in windows]
+
+    # Workers read the prices and the SMA matrix from shared memory instead of a pickled copy per task
+    shape = (2 + len(lengths), len(close))
+    memory = shared_memory.SharedMemory(create=True, size=max(shape[0] * close.nbytes, 1))
+    try:
+        prices = np.ndarray(shape, dtype=float, buffer=memory.buf)
+        prices[0] = close
+        prices[1] = complete
+        prices[2:] = moving_averages(close, lengths)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared_prices,
+                                 initargs=(memory.name, shape, lengths)) as executor:
+            task = partial(_shared_window_return, take_profit=take_profit, stop_loss=stop_loss)
+            chunk_size = max(len(windows) // (4 * (workers or os.cpu_count() or 1)), 1)
+            returns = list(executor.map(task, windows, chunksize=chunk_size))
+        del prices
+    finally:
+        memory.close()
+        memory.unlink()
+    return returns
+
+
+@instrument.timed()
+def optimize_strategy(data, take_profit, stop_loss, workers=1):
+    # workers=None uses every core, workers=1 runs the grid in this process
     best_cumulative_return = 0.0
-    best_strategy_return = 0.0
-    best_window = (10, 50)
-    best_data = data
-    best_cumulative_return_series = 0.0
-
-    for short_window in range(5, 50, 5):
-        for long_window in range(50, 200, 5):
-            if short_window >= long_window:
-                continue
-            window = (short_window, long_window)
-            strategy_data, cumulative_strategy_return, strategy_return = calculate_return(data.copy(), window, take_profit, stop_loss)
-            last_cumulative_return = cumulative_strategy_return.iloc[-1]
-
-            if last_cumulative_return > best_cumulative_return:
-                best_cumulative_return = last_cumulative_return
-                best_strategy_return = strategy_return
-                best_window = window
-                best_data = strategy_data
-                best_cumulative_return_series = cumulative_strategy_return
+    best_window = None
+    windows = strategy_windows()
+
+    for window, last_cumulative_return in zip(windows, grid_returns(data, windows, take_profit, stop_loss, workers)):
+        if last_cumulative_return > best_cumulative_return:
+            best_cumulative_return = last_cumulative_return
+            best_window = window
+
+    if best_window is None:
+        return data, (10, 50), 0.0, 0.0
+    best_data, best_cumulative_return_series, best_strategy_return = calculate_return(data.copy(), best_window, take_profit, stop_loss)
     return best_data, best_window, best_cumulative_return_series, best_strategy_return
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from panel import align_closes, best_windows, panel_backtest
+from strategy import calculate_return
+
+WINDOWS = [(5, 20), (10, 50), (20, 60)]
+
+
+def _tickers():
+    # Different trading days, a long gap, a missing price and a ticker too short for any window
+    rng = np.random.default_rng(6)
+    days = pd.date_range('2020-01-01', periods=400, freq='D')
+    dates = {
+        'AAA': days[:350],
+        'BBB': days[30:][rng.random(370) < 0.8],
+        'CCC': days[:120].append(days[200:]),
+        'DDD': days[385:],
+    }
+    data = {ticker: pd.DataFrame({'Close': 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(index))))}, index=index)
+            for ticker, index in dates.items()}
+    data['CCC'].iloc[150] = np.nan
+    return data
+
+
+def test_every_ticker_matches_calculate_return():
+    data = _tickers()
+    closes = align_closes(data)
+    returns, summary = panel_backtest(closes, WINDOWS, 0.05, 0.01)
+    assert list(returns.columns.get_level_values('Ticker').unique()) == list(data)
+
+    for ticker, frame in data.items():
+        for window in WINDOWS:
+            # A missing price is a date without a bar
+            result, cumulative, expected = calculate_return(frame.dropna().copy(), window, 0.05, 0.01)
+            actual = returns[(ticker, window)].dropna()
+            assert actual.index.equals(result.index)
+            np.testing.assert_array_equal(actual, expected)
+            # Windows are tuples, so the summary row is looked up by position
+            row = summary.iloc[summary.index.get_loc((ticker, window))]
+            assert row['Trades'] == result['Sell'].notna().sum()
+            if cumulative.empty:
+                assert np.isnan(row['Cumulative Return'])
+            else:
+                assert np.isclose(row['Cumulative Return'], cumulative.iloc[-1])
+
+
+def test_tickers_without_a_window_have_no_best_window():
+    _, summary = panel_backtest(align_closes(_tickers()), WINDOWS, 0.05, 0.01)
+    best = best_windows(summary)
+    assert list(best.index) == ['AAA', 'BBB', 'CCC', 'DDD']
+    assert best.loc['DDD', 'Window'] is None and np.isnan(best.loc['DDD', 'Cumulative Return'])
+    for ticker in ['AAA', 'BBB', 'CCC']:
+        scores = summary.xs(ticker, level='Ticker')['Cumulative Return']
+        assert best.loc[ticker, 'Window'] == WINDOWS[int(np.argmax(scores.to_numpy()))]
+        assert best.loc[ticker, 'Cumulative Return'] == scores.max()
@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from providers import CsvProvider, Provider, YahooProvider, read_range_cache, write_range_cache
+
+
+def _daily(start, end):
+    index = pd.date_range(start, end, freq='D', inclusive='left', name='Date')
+    return pd.DataFrame({'Open': 1.0, 'High': 2.0, 'Low': 0.5, 'Close': 1.5, 'Volume': 100.0}, index=index)
+
+
+class FlakyDownload:
+    # Fails with an empty frame like yfinance does on network errors, then returns the dates
+    def __init__(self, failures=1):
+        self.failures = failures
+        self.calls = []
+
+    def __call__(self, ticker, start, end):
+        self.calls.append((start, end))
+        if self.failures:
+            self.failures -= 1
+            return pd.DataFrame()
+        return _daily(start, end)
+
+
+def test_empty_download_is_fetched_again(tmp_path):
+    download = FlakyDownload()
+    provider = YahooProvider(cache_dir=str(tmp_path), download=download)
+
+    assert provider.get('TSLA', '2020-01-01', '2020-01-11').empty
+    data = provider.get('TSLA', '2020-01-01', '2020-01-11')
+    assert download.calls == [('2020-01-01', '2020-01-11')] * 2
+    assert len(data) == 10
+
+    # Now covered, nothing is downloaded again
+    assert provider.get('TSLA', '2020-01-03', '2020-01-08').equals(data.iloc[2:7])
+    assert len(download.calls) == 2
+
+
+def test_only_missing_ranges_are_downloaded(tmp_path):
+    download = FlakyDownload(failures=0)
+    provider = YahooProvider(cache_dir=str(tmp_path), download=download)
+    provider.get('TSLA', '2020-01-05', '2020-01-10')
+    data = provider.get('TSLA', '2020-01-01', '2020-01-15')
+    assert download.calls == [('2020-01-05', '2020-01-10'), ('2020-01-01', '2020-01-05'), ('2020-01-10', '2020-01-15')]
+    assert data.index.equals(_daily('2020-01-01', '2020-01-15').index)
+
+
+def test_provider_is_abstract():
+    with pytest.raises(TypeError):
+        Provider()
+
+
+def test_csv_date_range_covers_the_files():
+    provider = CsvProvider()
+    start, end = provider.date_range(['TSLA', 'UNKNOWN'])
+    assert len(provider.get('TSLA', start, end)) == len(provider.get('TSLA', '1900-01-01', '2100-01-01'))
+    assert provider.date_range(['UNKNOWN']) is None
+
+
+def test_range_cache_round_trip(tmp_path):
+    path = str(tmp_path / 'nested' / 'TSLA')
+    data, ranges = read_range_cache(path)
+    assert data.empty and ranges == []
+
+    ranges = [(pd.Timestamp('2020-01-01'), pd.Timestamp('2020-01-11')),
+              (pd.Timestamp('2020-02-01 09:30', tz='UTC'), pd.Timestamp('2020-02-02', tz='UTC'))]
+    write_range_cache(path, _daily('2020-01-01', '2020-01-11'), ranges)
+    data, read_ranges = read_range_cache(path)
+    pd.testing.assert_frame_equal(data, _daily('2020-01-01', '2020-01-11'), check_freq=False)
+    assert read_ranges == ranges
+    assert sorted(file.name for file in (tmp_path / 'nested').iterdir()) == ['TSLA.json', 'TSLA.parquet']
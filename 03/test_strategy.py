@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from strategy import calculate_return, exit_returns, grid_returns, moving_averages, optimize_strategy, strategy_windows
+
+
+def _random_signal(length, rng):
+    # Runs of buy and sell signals like an SMA crossover gives
+    return np.where(np.cumsum(rng.random(length) < 0.1) % 2 == 0, 1, -1)
+
+
+@pytest.mark.parametrize('take_profit, stop_loss', [(0.05, 0.01), (0.02, 0.02), (1.0, 1.0)])
+def test_exit_returns_match_the_loop(prices, loop_exits, take_profit, stop_loss):
+    rng = np.random.default_rng(1)
+    close = prices(1_000)['Close'].to_numpy()
+    signal = _random_signal(len(close), rng)
+    returns, exits = exit_returns(close, signal, take_profit, stop_loss)
+    expected_returns, expected_exits = loop_exits(close, signal, take_profit, stop_loss)
+    np.testing.assert_allclose(returns, expected_returns)
+    np.testing.assert_array_equal(exits, expected_exits)
+
+
+def test_columns_are_independent_series(prices, loop_exits):
+    rng = np.random.default_rng(2)
+    close = np.column_stack([prices(300, seed)['Close'].to_numpy() for seed in range(4)])
+    signal = np.column_stack([_random_signal(300, rng) for _ in range(4)])
+    take_profit = np.array([0.05, 0.02, 0.1, 0.03])
+    stop_loss = np.array([0.01, 0.02, 0.05, 0.03])
+    returns, exits = exit_returns(close, signal, take_profit, stop_loss)
+    for column in range(4):
+        expected_returns, expected_exits = loop_exits(close[:, column], signal[:, column], take_profit[column],
+                                                       stop_loss[column])
+        np.testing.assert_allclose(returns[:, column], expected_returns)
+        np.testing.assert_array_equal(exits[:, column], expected_exits)
+
+
+def test_short_series_have_no_trades(prices):
+    returns, exits = exit_returns(np.array([1.0]), np.array([1]), 0.05, 0.01)
+    assert returns.tolist() == [0.0] and exits.tolist() == [False]
+    returns, exits = exit_returns(np.empty((0, 3)), np.empty((0, 3), dtype=int), 0.05, 0.01)
+    assert returns.shape == exits.shape == (0, 3)
+
+    # Too few bars for the long SMA leave nothing to trade, like the loop did
+    data, cumulative, returns = calculate_return(prices(30), (10, 50), 0.05, 0.01)
+    assert data.empty and cumulative.empty and returns.empty
+
+
+def test_calculate_return_matches_the_loop(prices, loop_exits):
+    data, cumulative, returns = calculate_return(prices(), (10, 50), 0.05, 0.01)
+    expected_returns, expected_exits = loop_exits(data['Close'].to_numpy(), data['Signal'].to_numpy(), 0.05, 0.01)
+    expected_sma = prices()['Close'].rolling(50).mean().dropna()
+    np.testing.assert_allclose(data['SMA_long'], expected_sma)
+    np.testing.assert_allclose(returns, expected_returns)
+    np.testing.assert_array_equal(data['Sell'].notna(), expected_exits)
+    np.testing.assert_allclose(cumulative, np.cumsum(expected_returns))
+
+
+def test_optimize_strategy_is_the_same_in_a_process_pool(prices):
+    data = prices(600)
+    single = optimize_strategy(data.copy(), 0.05, 0.01, workers=1)
+    pooled = optimize_strategy(data.copy(), 0.05, 0.01, workers=None)
+    assert single[1] == pooled[1]
+    pd.testing.assert_frame_equal(single[0], pooled[0])
+    pd.testing.assert_series_equal(single[2], pooled[2])
+
+
+def test_moving_averages_match_rolling_means(prices):
+    close = prices(300)['Close']
+    close.iloc[[40, 41, 200]] = np.nan
+    windows = [1, 5, 20, 50, 300, 301]
+    averages = moving_averages(close, windows)
+    for row, window in enumerate(windows):
+        np.testing.assert_array_equal(averages[row], close.rolling(window).mean())
+
+
+def test_flat_stretches_keep_the_rolling_mean_signal():
+    # SMAs of different lengths over a flat stretch must tie exactly, or the signal flips to 1 and trades appear
+    close = np.concatenate((np.linspace(1.1, 1.2, 150), np.full(120, 1.2), np.linspace(1.2, 1.1, 150)))
+    data = pd.DataFrame({'Close': close}, index=pd.date_range('2020-01-01', periods=len(close), freq='h'))
+    result, _, _ = calculate_return(data.copy(), (10, 50), 0.05, 0.01)
+
+    expected = data.assign(SMA_short=data['Close'].rolling(10).mean(), SMA_long=data['Close'].rolling(50).mean())
+    expected = expected.dropna()
+    signal = np.where(expected['SMA_short'] > expected['SMA_long'], 1, -1)
+    np.testing.assert_array_equal(result['Signal'], signal)
+    np.testing.assert_array_equal(result['Buy'].notna().to_numpy()[1:], (signal[1:] == 1) & (signal[:-1] == -1))
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_grid_returns_match_calculate_return(prices, workers):
+    data = prices(500)
+    windows = strategy_windows()[::7]
+    returns = grid_returns(data, windows, 0.05, 0.01, workers=workers)
+    for window, result in zip(windows, returns):
+        _, cumulative, _ = calculate_return(data.copy(), window, 0.05, 0.01)
+        if cumulative.empty:
+            assert np.isnan(result)
+        else:
+            assert np.isclose(result, cumulative.iloc[-1], rtol=1e-12, atol=1e-12)
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+from strategy import exit_returns
+from walkforward import WindowTrades, range_returns, walk_forward, walk_forward_folds, window_signals
+
+WINDOWS = [(5, 20), (10, 30), (5, 50)]
+
+
+def test_close_at_end_closes_open_positions():
+    close = np.array([10., 10., 11., 11.2, 11.3])
+    signal = np.array([-1, -1, 1, 1, 1])
+    returns, exits = exit_returns(close, signal, 0.5, 0.5)
+    assert not exits.any()
+    returns, exits = exit_returns(close, signal, 0.5, 0.5, close_at_end=True)
+    assert exits.tolist() == [False, False, False, False, True]
+    assert returns[-1] == 11.3 / 11 - 1
+
+
+def test_range_returns_match_the_loop(prices, loop_exits):
+    close, signals = window_signals(prices(600, seed=1), WINDOWS)
+    values = close.to_numpy()
+    for start, end in [(0, 600), (100, 227), (250, 271), (598, 600)]:
+        returns = range_returns(values, signals, start, end, 0.05, 0.01)
+        for column in range(len(WINDOWS)):
+            expected, _ = loop_exits(values[start:end], signals[start:end, column], 0.05, 0.01, close_at_end=True)
+            np.testing.assert_allclose(returns[:, column], expected)
+
+
+def test_window_trades_give_the_returns_of_any_range(prices):
+    close, signals = window_signals(prices(600, seed=1), WINDOWS + [(10, 20), (20, 50)])
+    trades = WindowTrades(close, signals, 0.03, 0.01)
+    rng = np.random.default_rng(4)
+    ranges = [(0, 600), (0, 1), (0, 2), (597, 600), (598, 600)] + [tuple(sorted(rng.choice(601, 2, replace=False)))
+                                                                   for _ in range(300)]
+    for start, end in ranges:
+        expected = range_returns(close, signals, start, end, 0.03, 0.01)
+        np.testing.assert_array_equal(trades.range_returns(start, end), expected)
+        np.testing.assert_array_equal(trades.range_returns(start, end).sum(axis=0), expected.sum(axis=0))
+        np.testing.assert_array_equal(trades.range_returns(start, end, [2, 0])[:, 0], expected[:, 2])
+
+
+def test_no_trade_is_carried_into_a_test_range():
+    # A position opened in the train range and sold in the test range is credited to neither of them
+    close = np.array([10., 10., 10., 12., 12., 12.])
+    signals = np.array([[-1], [-1], [1], [1], [-1], [-1]])
+    assert range_returns(close, signals, 3, 6, 0.5, 0.5).sum() == 0
+    assert WindowTrades(close, signals, 0.5, 0.5).range_returns(3, 6).sum() == 0
+    np.testing.assert_allclose(range_returns(close, signals, 0, 3, 0.5, 0.5)[:, 0], [0, 0, 0])
+
+
+def test_folds_use_their_own_ranges(prices):
+    data = prices(600, seed=1)
+    folds, out_of_sample, equity = walk_forward(data, 0.05, 0.01, train_size=126, test_size=21, windows=WINDOWS)
+    close, signals = window_signals(data, WINDOWS)
+    positions = walk_forward_folds(len(close), 126, 21)
+    assert len(folds) == len(positions)
+    for window, test_return, (train_start, train_end, test_start, test_end) in zip(
+            folds['Window'], folds['Out-of-Sample Return'], positions):
+        in_sample = range_returns(close, signals, train_start, train_end, 0.05, 0.01).sum(axis=0)
+        best = int(np.argmax(in_sample))
+        assert window == WINDOWS[best]
+        assert np.isclose(test_return, range_returns(close, signals, test_start, test_end, 0.05, 0.01)[:, best].sum())
+    assert np.isclose(equity.iloc[-1], folds['Out-of-Sample Return'].sum())
+    assert len(out_of_sample) == 21 * len(folds)
+
+
+def test_workers_give_the_same_folds(prices):
+    data = prices(600, seed=1)
+    single = walk_forward(data, 0.05, 0.01, train_size=100, test_size=50, step=25, windows=WINDOWS)
+    parallel = walk_forward(data, 0.05, 0.01, train_size=100, test_size=50, step=25, windows=WINDOWS, workers=2)
+    pd.testing.assert_frame_equal(single[0], parallel[0])
+    pd.testing.assert_series_equal(single[1], parallel[1])
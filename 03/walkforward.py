@@ -0,0 +1,154 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from strategy import exit_returns, grid_averages, moving_averages, strategy_windows
+
+
+def window_signals(data, windows):
+    """
+    Close prices and the crossover signal of every window, one column per window (0 before both SMAs exist).
+    An SMA only looks back, so the signals of any range of bars are the same as when it is traded on its own,
+    and they are computed once for all folds.
+    """
+    close = data['Close'].dropna()
+    lengths = grid_averages(windows)
+    averages = dict(zip(lengths, moving_averages(close.to_numpy(), lengths)))
+    signals = np.zeros((len(close), len(windows)), dtype=int)
+    for column, (short_window, long_window) in enumerate(windows):
+        sma_short, sma_long = averages[short_window], averages[long_window]
+        active = ~np.isnan(sma_short) & ~np.isnan(sma_long)
+        signals[:, column] = np.where(active, np.where(sma_short > sma_long, 1, -1), 0)
+    return close, signals
+
+
+def range_returns(close, signals, start, end, take_profit, stop_loss):
+    """
+    Per-bar returns of every signal column traded on bars [start, end) alone: no position is carried in from
+    earlier bars, and positions still open on the last bar are closed at its price.
+    """
+    close = np.asarray(close, dtype=float)[start:end]
+    signals = signals[start:end]
+    returns, _ = exit_returns(np.broadcast_to(close[:, None], signals.shape), signals, take_profit, stop_loss,
+                              close_at_end=True)
+    return returns
+
+
+class WindowTrades:
+    """
+    Trades of every signal column over the whole series, made once and reused for the returns of any range of bars.
+    A trade only depends on its entry bar, and the next entry only comes after it exited, so a range traded on its
+    own makes the same trades as the whole series except for the one carried in, which it leaves out, and the one
+    still open on its last bar, which it closes at that price.
+    """
+
+    def __init__(self, close, signals, take_profit, stop_loss):
+        self.close = np.asarray(close, dtype=float)
+        self.returns, exits = exit_returns(np.broadcast_to(self.close[:, None], signals.shape), signals, take_profit,
+                                           stop_loss)
+        entries = np.zeros(signals.shape, dtype=bool)
+        entries[1:] = (signals[1:] == 1) & (signals[:-1] == -1)
+        bars = np.arange(len(self.close))[:, None]
+        # Latest entry and exit at or before every bar, and the first exit at or after it (len(close) if none)
+        self.last_entry = np.maximum.accumulate(np.where(entries, bars, -1), axis=0)
+        self.last_exit = np.maximum.accumulate(np.where(exits, bars, -1), axis=0)
+        self.next_exit = np.minimum.accumulate(np.where(exits, bars, len(self.close))[::-1], axis=0)[::-1]
+
+    def range_returns(self, start, end, columns=None):
+        """
+        Per-bar returns of the columns (all by default) traded on bars [start, end) alone, equal to range_returns
+        down to the last bit, so sums and ties between windows come out the same.
+        """
+        columns = np.arange(self.returns.shape[1]) if columns is None else np.asarray(columns)
+        returns = np.array(self.returns[start:end, columns], order='F')
+        if end - start < 2:
+            return np.zeros_like(returns)
+        # Exits on the first bar close trades entered before the range
+        returns[0] = 0.0
+        carried = self.last_entry[start, columns] > self.last_exit[start, columns]
+        carried_exit = self.next_exit[start + 1, columns]
+        carried &= carried_exit < end
+        returns[carried_exit[carried] - start, np.flatnonzero(carried)] = 0.0
+
+        # A trade entered in the range and open after its last bar is closed there, one entered on it is not held
+        entry = self.last_entry[end - 2, columns]
+        still_open = (entry > start) & (entry > self.last_exit[end - 1, columns])
+        returns[-1, still_open] = self.close[end - 1] / self.close[entry[still_open]] - 1
+        return returns
+
+
+def walk_forward_folds(length, train_size, test_size, step=None, anchored=False):
+    """
+    Returns (train_start, train_end, test_start, test_end) bar positions of every fold.
+    Test ranges follow their train range and move forward by step bars (test_size by default).
+
+    anchored: Every train range starts at the first bar instead of sliding
+    """
+    step = step or test_size
+    folds = []
+    train_start = 0
+    while train_start + train_size + test_size <= length:
+        train_end = train_start + train_size
+        folds.append((0 if anchored else train_start, train_end, train_end, train_end + test_size))
+        train_start += step
+    return folds
+
+
+def _run_folds(trades, folds):
+    # Best window, its in-sample return and its out-of-sample returns per fold
+    results = []
+    for train_start, train_end, test_start, test_end in folds:
+        in_sample = trades.range_returns(train_start, train_end).sum(axis=0)
+        best = int(np.argmax(in_sample))
+        test = trades.range_returns(test_start, test_end, [best])[:, 0]
+        results.append((best, in_sample[best], test))
+    return results
+
+
+def walk_forward(data, take_profit, stop_loss, train_size=126, test_size=21, step=None, anchored=False,
+                 windows=None, workers=1):
+    """
+    Walk-forward optimization: picks the best window on every train range and trades it on the following test range.
+    Both ranges are traded on their own, starting without a position and closing what is still open on their
+    last bar, so no trade entered before a test range is credited to it. The signals and trades of every window
+    are computed once over the whole series (see WindowTrades), and every range reads its returns from them
+    instead of trading all windows again.
+
+    Returns the fold table (chosen window, in-sample and out-of-sample return), the out-of-sample returns and
+    the out-of-sample equity curve (cumulative return). A later fold overwrites the test bars it shares with an
+    earlier one when step is smaller than test_size.
+
+    workers: Number of processes the folds are split over, None uses every core
+    """
+    windows = [tuple(window) for window in (windows or strategy_windows())]
+    close, signals = window_signals(data, windows)
+    folds = walk_forward_folds(len(close), train_size, test_size, step, anchored)
+    trades = WindowTrades(close, signals, take_profit, stop_loss)
+
+    chunk_count = 1 if workers == 1 else (workers or os.cpu_count() or 1)
+    chunks = [chunk for chunk in np.array_split(np.arange(len(folds)), chunk_count) if len(chunk)]
+    if len(chunks) <= 1:
+        results = _run_folds(trades, folds)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run_folds, trades, [folds[i] for i in chunk]) for chunk in chunks]
+            results = [result for future in futures for result in future.result()]
+
+    rows = []
+    out_of_sample = pd.Series(np.nan, index=close.index)
+    for (train_start, train_end, test_start, test_end), (best, in_sample, test) in zip(folds, results):
+        out_of_sample.iloc[test_start:test_end] = test
+        rows.append({
+            'Train Start': close.index[train_start],
+            'Train End': close.index[train_end - 1],
+            'Test Start': close.index[test_start],
+            'Test End': close.index[test_end - 1],
+            'Window': windows[best],
+            'In-Sample Return': in_sample,
+            'Out-of-Sample Return': test.sum(),
+        })
+
+    out_of_sample = out_of_sample.dropna()
+    return pd.DataFrame(rows), out_of_sample, out_of_sample.cumsum()
@@ -0,0 +1,256 @@
+import asyncio
+import collections
+import dataclasses
+import datetime
+import math
+import time
+import zlib
+
+from eventkit import Event
+from ib_insync import (BarData, BarDataList, CommissionReport, Execution, Fill, OrderStatus, Ticker, Trade,
+                       TradeLogEntry)
+
+from service import bar_size_seconds, duration_seconds
+
+
+def _noise(symbol, seconds):
+    # Deterministic value in [-1, 1) for a symbol and a point in time
+    return ((zlib.crc32(f"{symbol}{seconds}".encode()) % 2 ** 16) / 2 ** 15) - 1
+
+
+def price_at(symbol, seconds):
+    """
+    Canned price of a symbol at a POSIX time. Overlapping requests always see the same prices.
+    """
+    base = 1 + zlib.crc32(symbol.encode()) % 200
+    return base * (1 + 0.02 * math.sin(seconds / 604_800 * 2 * math.pi)
+                   + 0.002 * math.sin(seconds / 3_600 * 2 * math.pi)
+                   + 0.0005 * _noise(symbol, seconds))
+
+
+def _symbol(contract):
+    return f"{contract.symbol}{contract.currency}" if contract.secType == 'CASH' else contract.symbol
+
+
+class FakeIB:
+    """
+    In-process stand-in for ib_insync.IB with the same method names and events, for running the 04 services
+    without TWS or IB Gateway. Market data tickers update every tick_interval seconds, historical requests
+    return canned bars, orders are submitted after latency seconds and market orders fill at the canned price.
+
+    latency: Seconds every request takes
+    refused_connections: Number of connection attempts to refuse, e.g. to exercise reconnects
+    max_requests, pacing_window: Historical requests beyond max_requests in any pacing_window seconds fail with
+                                 IB's pacing violation error 162 and return no bars
+    closed_days: Weekdays (Monday is 0) without historical bars, e.g. (5, 6) for a weekend
+    time_zone: Time zone of the TWS, historical bars requested with formatDate=1 are in its local time
+    """
+
+    def __init__(self, tick_interval=0.1, latency=0.0, refused_connections=0, max_requests=60, pacing_window=600,
+                 closed_days=(), time_zone=datetime.timezone(datetime.timedelta(hours=-5))):
+        self.tick_interval = tick_interval
+        self.latency = latency
+        self.refused_connections = refused_connections
+        self.max_requests = max_requests
+        self.pacing_window = pacing_window
+        self.closed_days = set(closed_days)
+        self.time_zone = time_zone
+        self.pacing_violations = 0
+        self._request_times = collections.deque()
+        self.connectedEvent = Event('connectedEvent')
+        self.disconnectedEvent = Event('disconnectedEvent')
+        self.errorEvent = Event('errorEvent')
+        self.openOrderEvent = Event('openOrderEvent')
+        self.orderStatusEvent = Event('orderStatusEvent')
+        self.execDetailsEvent = Event('execDetailsEvent')
+        self.orders = {}
+        self.next_order_id = 1
+        self.tickers = {}
+        self.connections = 0
+        self.historical_requests = []
+        self._connected = False
+        self._ticking = None
+
+    def isConnected(self):
+        return self._connected
+
+    def _check_connected(self):
+        if not self._connected:
+            raise ConnectionError("Not connected")
+
+    async def connectAsync(self, host='127.0.0.1', port=7497, clientId=1, timeout=4, readonly=False, account=''):
+        await asyncio.sleep(self.latency)
+        if self.refused_connections:
+            self.refused_connections -= 1
+            raise ConnectionRefusedError(f"Connect call failed ('{host}', {port})")
+        self._connected = True
+        self.connections += 1
+        self._ticking = asyncio.ensure_future(self._tick())
+        # Like ib_insync, the open orders come back as new Trade objects after a reconnect
+        for order_id, trade in list(self.orders.items()):
+            if trade.orderStatus.status in OrderStatus.ActiveStates and self.connections > 1:
+                self.orders[order_id] = Trade(trade.contract, trade.order, dataclasses.replace(trade.orderStatus),
+                                              list(trade.fills), list(trade.log))
+                self.openOrderEvent.emit(self.orders[order_id])
+        self.connectedEvent.emit()
+        return self
+
+    def disconnect(self):
+        if not self._connected:
+            return
+        self._connected = False
+        self._ticking.cancel()
+        self.tickers.clear()
+        self.disconnectedEvent.emit()
+
+    def drop_connection(self):
+        """
+        Closes the connection from the gateway side, like a TWS restart.
+        """
+        self.disconnect()
+
+    def reqMktData(self, contract, genericTickList='', snapshot=False, regulatorySnapshot=False, mktDataOptions=()):
+        self._check_connected()
+        ticker = self.tickers.setdefault(_symbol(contract), Ticker(contract=contract))
+        return ticker
+
+    def cancelMktData(self, contract):
+        self._check_connected()
+        self.tickers.pop(_symbol(contract), None)
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            now = datetime.datetime.now(datetime.timezone.utc)
+            for symbol, ticker in list(self.tickers.items()):
+                price = price_at(symbol, now.timestamp())
+                spread = price * 0.0001
+                ticker.time = now
+                ticker.bid, ticker.ask = price - spread, price + spread
+                ticker.bidSize, ticker.askSize = 1_000_000, 1_000_000
+                ticker.last, ticker.lastSize = price, 100_000 + int(50_000 * _noise(symbol, now.timestamp()))
+                ticker.high = price if math.isnan(ticker.high) else max(ticker.high, price)
+                ticker.low = price if math.isnan(ticker.low) else min(ticker.low, price)
+                ticker.updateEvent.emit(ticker)
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH,
+                                     formatDate=1, keepUpToDate=False, chartOptions=(), timeout=60):
+        self._check_connected()
+        self.historical_requests.append((_symbol(contract), endDateTime, durationStr, barSizeSetting))
+        now = time.monotonic()
+        while self._request_times and self._request_times[0] <= now - self.pacing_window:
+            self._request_times.popleft()
+        self._request_times.append(now)
+        paced = len(self._request_times) <= self.max_requests
+        await asyncio.sleep(self.latency)
+        self._check_connected()
+        if not paced:
+            self.pacing_violations += 1
+            self.errorEvent.emit(-1, 162, "Historical Market Data Service error message:"
+                                          "Historical data request pacing violation", contract)
+            return BarDataList()
+
+        end = endDateTime or datetime.datetime.now(datetime.timezone.utc)
+        if isinstance(end, str):
+            end = datetime.datetime.strptime(end, '%Y%m%d %H:%M:%S')
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=datetime.timezone.utc)
+        step = bar_size_seconds(barSizeSetting)
+        last = int(end.timestamp()) // step * step
+        first = last - duration_seconds(durationStr) // step * step
+
+        symbol = _symbol(contract)
+        bars = BarDataList()
+        for start in range(first, last, step):
+            date = datetime.datetime.fromtimestamp(start, datetime.timezone.utc)
+            if date.weekday() in self.closed_days:
+                continue
+            open_, close = price_at(symbol, start), price_at(symbol, start + step)
+            wick = abs(_noise(symbol, start + 1)) * 0.0005 * open_
+            # formatDate=2 gives UTC times, 1 gives TWS local times without a time zone
+            date = date if formatDate == 2 else date.astimezone(self.time_zone).replace(tzinfo=None)
+            bars.append(BarData(
+                date=date.date() if step >= 86_400 else date, open=open_, high=max(open_, close) + wick,
+                low=min(open_, close) - wick, close=close, volume=-1, average=(open_ + close) / 2, barCount=-1,
+            ))
+        if not bars:
+            self.errorEvent.emit(-1, 162, "Historical Market Data Service error message:HMDS query returned no data",
+                                 contract)
+        return bars
+
+    def openTrades(self):
+        return [trade for trade in self.orders.values() if trade.orderStatus.status in OrderStatus.ActiveStates]
+
+    def trades(self):
+        return list(self.orders.values())
+
+    def openOrders(self):
+        return [trade.order for trade in self.openTrades()]
+
+    def _later(self, callback, *args):
+        try:
+            asyncio.get_running_loop().call_later(self.latency, callback, *args)
+        except RuntimeError:
+            callback(*args)
+
+    def _set_status(self, trade, status):
+        trade.orderStatus.status = status
+        trade.log.append(TradeLogEntry(datetime.datetime.now(datetime.timezone.utc), status))
+        trade.statusEvent.emit(trade)
+        self.orderStatusEvent.emit(trade)
+
+    def placeOrder(self, contract, order):
+        self._check_connected()
+        order.orderId = order.orderId or self.next_order_id
+        self.next_order_id = max(self.next_order_id, order.orderId + 1)
+        trade = Trade(contract, order, OrderStatus(orderId=order.orderId, status=OrderStatus.PendingSubmit,
+                                                   remaining=order.totalQuantity))
+        self.orders[order.orderId] = trade
+        self._later(self._submit, trade)
+        return trade
+
+    def _submit(self, trade):
+        if trade.orderStatus.status != OrderStatus.PendingSubmit:
+            return
+        self._set_status(trade, OrderStatus.Submitted)
+        self.openOrderEvent.emit(trade)
+        if trade.order.orderType == 'MKT':
+            self.fill(trade.order.orderId)
+
+    def fill(self, order_id, price=None, shares=None):
+        """
+        Fills a working order, completely by default, at price or the canned price of its symbol.
+        """
+        trade = self.orders[order_id]
+        if trade.orderStatus.status not in OrderStatus.ActiveStates:
+            return trade
+        now = datetime.datetime.now(datetime.timezone.utc)
+        price = price or trade.order.lmtPrice or price_at(_symbol(trade.contract), now.timestamp())
+        shares = shares or trade.orderStatus.remaining
+        execution = Execution(execId=f"{order_id}.{len(trade.fills) + 1}", time=now, side=trade.order.action,
+                              shares=shares, price=price, orderId=order_id)
+        fill = Fill(trade.contract, execution, CommissionReport(), now)
+        trade.fills.append(fill)
+        trade.orderStatus.filled += shares
+        trade.orderStatus.remaining -= shares
+        trade.orderStatus.lastFillPrice = price
+        trade.fillEvent.emit(trade, fill)
+        self.execDetailsEvent.emit(trade, fill)
+        self._set_status(trade, OrderStatus.Filled if trade.orderStatus.remaining <= 0 else OrderStatus.Submitted)
+        if trade.orderStatus.status == OrderStatus.Filled:
+            trade.filledEvent.emit(trade)
+        return trade
+
+    def cancelOrder(self, order, manualCancelOrderTime=''):
+        self._check_connected()
+        trade = self.orders.get(order.orderId)
+        if trade is None or trade.orderStatus.status in OrderStatus.DoneStates:
+            return None
+        trade.cancelEvent.emit(trade)
+        self._set_status(trade, OrderStatus.PendingCancel)
+        self._later(self._cancelled, trade)
+        return trade
+
+    def _cancelled(self, trade):
+        self._set_status(trade, OrderStatus.Cancelled)
+        trade.cancelledEvent.emit(trade)
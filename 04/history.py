@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import collections
+import datetime
+import logging
+import os
+import sys
+import time
+
+import pandas as pd
+from ib_insync import Forex
+
+if __name__ == '__main__':
+    # Run as a script: the range helpers live in lab 3, which imports instrument from lab 1
+    for lab in ('01', '03'):
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', lab))
+
+from providers import DATA_DIR, merge_ranges, missing_ranges, read_range_cache, write_range_cache
+from records import bars_frame
+from service import bar_size_seconds, duration_seconds
+
+logger = logging.getLogger(__name__)
+
+# Longest duration IB serves in one request for bars up to the given number of seconds
+CHUNK_DURATIONS = [
+    (1, '1800 S'), (5, '3600 S'), (10, '14400 S'), (30, '28800 S'), (60, '1 D'), (180, '2 D'),
+    (1_800, '1 W'), (3_600, '1 M'), (86_400, '1 Y'),
+]
+
+
+def chunk_duration(bar_size):
+    """
+    IB duration string of one request for the bar size, e.g. '1 D' for '1 min'.
+    """
+    seconds = bar_size_seconds(bar_size)
+    for longest_bar, duration in CHUNK_DURATIONS:
+        if seconds <= longest_bar:
+            return duration
+    return CHUNK_DURATIONS[-1][1]
+
+
+class Pacer:
+    """
+    Sliding window rate limit: at most max_requests requests in any window seconds.
+
+    margin: Fraction the window is stretched by, as IB counts from when it receives a request
+    """
+
+    def __init__(self, max_requests, window, margin=0.05):
+        self.max_requests = max_requests
+        self.window = window * (1 + margin)
+        self.sent = collections.deque()
+
+    def wait_time(self, now):
+        """
+        Seconds until another request may be sent.
+        """
+        while self.sent and self.sent[0] <= now - self.window:
+            self.sent.popleft()
+        if len(self.sent) < self.max_requests:
+            return 0.
+        return self.sent[0] + self.window - now
+
+    def add(self, now):
+        self.sent.append(now)
+
+
+class HistoryDownloader:
+    """
+    Backfills long ranges of historical bars. A range is split into requests of the longest duration IB allows
+    for the bar size, the requests run concurrently within IB's pacing limits, and the merged bars are kept in a
+    Parquet cache per symbol and bar size. Only the parts of a range that were never downloaded are requested,
+    so repeating a request fetches just the new tail. Requests that return no bars are marked as downloaded
+    once they ended settle_time ago (weekends, holidays), unless IB reported an error for the contract during
+    the download (e.g. a pacing violation), in which case they are sent again next time.
+
+    ib: A connected ib_insync.IB, or fake_ib.FakeIB
+    settle_time: Age after which a range without bars is taken as closed instead of not yet published
+    max_concurrent: Requests in flight at once
+    max_requests, pacing_window: IB allows 60 historical requests in any 10 minutes
+    max_contract_requests, contract_window: and 6 for the same contract in any 2 seconds
+    """
+
+    def __init__(self, ib, cache_dir=os.path.join(DATA_DIR, '.cache', 'ib'), contract_factory=Forex,
+                 what_to_show='MIDPOINT', use_rth=True, settle_time=pd.Timedelta(days=1), max_concurrent=6,
+                 max_requests=60, pacing_window=600, max_contract_requests=6, contract_window=2):
+        self.ib = ib
+        self.settle_time = pd.Timedelta(settle_time)
+        self.cache_dir = cache_dir
+        self.contract_factory = contract_factory
+        self.what_to_show = what_to_show
+        self.use_rth = use_rth
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self.pacing_lock = asyncio.Lock()
+        self.pacer = Pacer(max_requests, pacing_window)
+        self.contract_pacing = (max_contract_requests, contract_window)
+        self.contract_pacers = {}
+        self.locks = {}
+
+    def _cache_path(self, symbol, bar_size):
+        return os.path.join(self.cache_dir, f"{symbol}-{bar_size.replace(' ', '')}-{self.what_to_show}")
+
+    async def _request(self, contract, symbol, end, duration, bar_size):
+        contract_pacer = self.contract_pacers.setdefault(symbol, Pacer(*self.contract_pacing))
+        async with self.slots:
+            # Both limits have to allow the request at the moment it is sent
+            async with self.pacing_lock:
+                while True:
+                    now = time.monotonic()
+                    wait = max(self.pacer.wait_time(now), contract_pacer.wait_time(now))
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                self.pacer.add(now)
+                contract_pacer.add(now)
+            bars = await self.ib.reqHistoricalDataAsync(
+                contract, endDateTime=end.to_pydatetime().replace(tzinfo=datetime.timezone.utc),
+                durationStr=duration, barSizeSetting=bar_size, whatToShow=self.what_to_show,
+                useRTH=self.use_rth, formatDate=2,
+            )
+        if not bars:
+            logger.warning("No bars for %s before %s", symbol, end)
+            return pd.DataFrame()
+        # formatDate=2 gives UTC times, the cache holds them without a time zone
+        return bars_frame(bars)
+
+    async def download(self, symbol, start, end, bar_size='1 min'):
+        """
+        Returns the bars of symbol in [start, end) as an OHLCV frame with a UTC DateTime index.
+        """
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        step = pd.Timedelta(seconds=bar_size_seconds(bar_size))
+        duration = chunk_duration(bar_size)
+        chunk = pd.Timedelta(seconds=duration_seconds(duration))
+        contract = self.contract_factory(symbol)
+
+        async with self.locks.setdefault((symbol, bar_size), asyncio.Lock()):
+            data, ranges = read_range_cache(self._cache_path(symbol, bar_size))
+            missing = missing_ranges(ranges, start, end)
+            if missing:
+                # Every request ends where the previous, later one started
+                requests = [(max(chunk_end - chunk, fetch_start), chunk_end) for fetch_start, fetch_end in missing
+                            for chunk_end in pd.date_range(end=fetch_end, freq=chunk,
+                                                           periods=-(-(fetch_end - fetch_start) // chunk))]
+                logger.info("Requesting %d chunks of %s for %s", len(requests), duration, symbol)
+                errors = []
+
+                def on_error(req_id, code, message, error_contract=None):
+                    # IB reports empty ranges as an error too, those are not failures
+                    if error_contract == contract and 'no data' not in message.lower():
+                        errors.append(code)
+
+                self.ib.errorEvent += on_error
+                try:
+                    frames = await asyncio.gather(*(self._request(contract, symbol, chunk_end, duration, bar_size)
+                                                    for _, chunk_end in requests))
+                finally:
+                    self.ib.errorEvent -= on_error
+                data = pd.concat([data] + [frame for frame in frames if not frame.empty])
+                data = data[~data.index.duplicated(keep='last')].sort_index()
+                # The bar that is still building is requested again next time
+                now = pd.Timestamp.now(tz='UTC').tz_localize(None)
+                complete = now.floor(step)
+                settled = now - self.settle_time
+                ranges += [(chunk_start, min(chunk_end, complete))
+                           for (chunk_start, chunk_end), frame in zip(requests, frames)
+                           if chunk_start < complete and (not frame.empty or (chunk_end <= settled and not errors))]
+                write_range_cache(self._cache_path(symbol, bar_size), data, merge_ranges(ranges))
+
+        if data.empty:
+            return data
+        return data[(data.index >= start) & (data.index < end)]
+
+    async def download_many(self, symbols, start, end, bar_size='1 min'):
+        """
+        Downloads the same range for many symbols concurrently, all sharing the pacing limits. Returns symbol -> frame.
+        """
+        frames = await asyncio.gather(*(self.download(symbol, start, end, bar_size) for symbol in symbols))
+        return dict(zip(symbols, frames))
+
+
+async def _run(args, ib):
+    await ib.connectAsync('127.0.0.1', 7497, clientId=2)
+    try:
+        downloader = HistoryDownloader(ib)
+        for symbol, data in (await downloader.download_many(args.symbols, args.start, args.end, args.bar_size)).items():
+            print(f"{symbol}: {len(data)} bars from {data.index.min()} to {data.index.max()}")
+    finally:
+        ib.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Backfill and cache historical bars from IB")
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--start', required=True)
+    parser.add_argument('--end', default=pd.Timestamp.now(tz='UTC').tz_localize(None).ceil('D').isoformat())
+    parser.add_argument('--bar-size', default='1 min')
+    parser.add_argument('--fake', action='store_true', help="Use the in-process fake gateway instead of TWS")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.fake:
+        from fake_ib import FakeIB
+        ib = FakeIB()
+    else:
+        from ib_insync import IB
+        ib = IB()
+    asyncio.run(_run(args, ib))
@@ -1,21 +1,35 @@
+import os
+import sys
+
 import matplotlib.pyplot as plt
-from ib_insync import IB, util, Forex, Order
+from ib_insync import IB, Forex
+
+# instrument is imported from lab 1
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '01'))
 
+import instrument
+from orders import OrderBook
+from records import bars_frame
 
+
+@instrument.timed()
 def on_fill_event(trade, fill):
     print(f"Fill Event: Trade {trade.contract.symbol} order {trade.order.orderId} "
           f"filled {fill.execution.shares} shares at {fill.execution.price}")
 
 
+@instrument.timed()
 def on_cancel_event(trade):
     print(f"Cancel Event: Trade {trade.contract.symbol} order {trade.order.orderId} was cancelled.")
 
 
+@instrument.timed()
 def on_status_event(trade):
     print(f"Status Event: Trade {trade.contract.symbol} order {trade.order.orderId} "
           f"status changed to {trade.orderStatus.status}")
 
 
+@instrument.timed()
 def on_realtime_update(data):
     print(
         f"Real-time Update - {data.contract.symbol}\n"
@@ -28,13 +42,16 @@ def on_realtime_update(data):
 
 
 def connect_ib():
+    global book
     ib.connect('127.0.0.1', 7497, clientId=1)
+    book = OrderBook(ib)
 
 
 def create_contract(symbol):
     return Forex(symbol)
 
 
+@instrument.timed()
 def fetch_and_visualize(symbol, duration, bar_size):
     contract = create_contract(symbol)
 
@@ -45,14 +62,14 @@ def fetch_and_visualize(symbol, duration, bar_size):
         barSizeSetting=bar_size,
         whatToShow='MIDPOINT',
         useRTH=True,
-        formatDate=1
+        # UTC times, formatDate=1 would give TWS local times without a time zone
+        formatDate=2
     )
 
     ib.disconnect()
 
     if bars:
-        df = util.df(bars)
-        plot_data(df, symbol)
+        plot_data(bars_frame(bars), symbol)
 
 
 def fetch_real_time_data():
@@ -72,9 +89,8 @@ def fetch_real_time_data():
 
 
 def plot_data(df, symbol):
-    df.set_index('date', inplace=True)
     plt.figure(figsize=(10, 5))
-    plt.plot(df['close'], label='Close Price', color='blue')
+    plt.plot(df['Close'], label='Close Price', color='blue')
     plt.title(f'Historical Data for {symbol}')
     plt.xlabel('Date')
     plt.ylabel('Close Price')
@@ -112,13 +128,7 @@ def place_order():
     price = float(input("Enter the price or 0 for MKT: "))
     order_type = 'LMT' if price != 0 else 'MKT'
 
-    order = Order(
-        orderType=order_type,
-        action=action,
-        totalQuantity=quantity,
-        lmtPrice=price if price != 0 else None
-    )
-    trade = ib.placeOrder(contract, order)
+    trade = book.place(contract, action, quantity, price)
     trade.fillEvent += on_fill_event
     trade.cancelEvent += on_cancel_event
     trade.statusEvent += on_status_event
@@ -135,29 +145,33 @@ def place_order():
 
 
 def print_orders():
-    open_orders = ib.reqOpenOrders()
+    # Picks up orders of other clients, the book tracks them through openOrderEvent
+    ib.reqOpenOrders()
 
     print("Open Orders:")
-    for order in open_orders:
-        print(order.orderStatus.status, order.contract.symbol)
+    for trade in book.active():
+        print(trade.order.orderId, trade.orderStatus.status, trade.contract.symbol)
 
 
 def cancel_order():
     order_id = int(input("Enter the order ID to cancel: "))
     print("Cancelling order...")
-    orders = ib.openOrders()
-    if not orders:
+    if not book.active():
         print("No open orders.")
         return
 
-    for order in orders:
-        if order.orderId == order_id:
-            ib.cancelOrder(order)
-            print(f"Order {order_id} cancelled")
-            return
+    if book.cancel(order_id):
+        print(f"Order {order_id} cancelled")
+        return
     print(f"Order {order_id} not found")
 
 
+def cancel_symbol_orders():
+    symbol = input("Enter the symbol: ")
+    trades = book.cancel_symbol(symbol)
+    print(f"Cancelling {len(trades)} orders for {symbol}")
+
+
 def main_menu():
     connect_ib()
     try:
@@ -169,6 +183,7 @@ def main_menu():
             print("4. Print Orders")
             print("5. Cancel Order")
             print("6. Real-Time Data")
+            print("7. Cancel All Orders for Symbol")
             print("Type 'exit' to quit")
             option = input("Choose an option: ")
 
@@ -184,6 +199,8 @@ def main_menu():
                 cancel_order()
             elif option == '6':
                 fetch_real_time_data()
+            elif option == '7':
+                cancel_symbol_orders()
             elif option.lower() == 'exit':
                 ib.disconnect()
                 print("Goodbye!")
@@ -0,0 +1,163 @@
+from collections import defaultdict
+
+from ib_insync import Forex, Order, OrderStatus
+
+
+def make_order(action, quantity, price=0):
+    """
+    Limit order at price, or a market order for a price of 0, like place_order in main.py.
+    """
+    return Order(
+        orderType='LMT' if price != 0 else 'MKT',
+        action=action,
+        totalQuantity=quantity,
+        lmtPrice=price if price != 0 else None,
+    )
+
+
+def _symbol(contract):
+    return contract.pair() if contract.secType == 'CASH' else contract.symbol
+
+
+class OrderBook:
+    """
+    Local copy of the order state, indexed by orderId, symbol and status so every lookup is O(1) instead of a
+    scan of ib.openOrders(). The indexes follow the status, fill and cancel events of every tracked trade.
+    Batch operations send all their requests at once without waiting for IB to answer each of them.
+    After a reconnect ib_insync hands out new Trade objects for the open orders, they replace the old ones.
+
+    ib: A connected ib_insync.IB, or fake_ib.FakeIB
+    on_update: Optional callback(trade) after the indexes took in an event
+    """
+
+    def __init__(self, ib, contract_factory=Forex, on_update=None):
+        self.ib = ib
+        self.contract_factory = contract_factory
+        self.on_update = on_update
+        self.trades = {}
+        self.by_symbol = defaultdict(set)
+        self.by_status = defaultdict(set)
+        self.status = {}
+        # Orders placed before the book existed or by other clients of the same account
+        self.refresh()
+        ib.openOrderEvent += self.track
+        ib.connectedEvent += self.refresh
+
+    def close(self):
+        self.ib.openOrderEvent -= self.track
+        self.ib.connectedEvent -= self.refresh
+        for trade in self.trades.values():
+            self._unfollow(trade)
+
+    def refresh(self):
+        """
+        Tracks every open trade of the connection, e.g. the new Trade objects after a reconnect.
+        """
+        for trade in self.ib.openTrades():
+            self.track(trade)
+
+    def __len__(self):
+        return len(self.trades)
+
+    def track(self, trade):
+        """
+        Adds a trade to the indexes and follows its events. Tracking a trade again only refreshes it, and a new
+        Trade object for a known orderId replaces the old one.
+        """
+        order_id = trade.order.orderId
+        known = self.trades.get(order_id)
+        if known is not trade:
+            if known is not None:
+                self._unfollow(known)
+                self.by_symbol[_symbol(known.contract)].discard(order_id)
+            self.trades[order_id] = trade
+            self.by_symbol[_symbol(trade.contract)].add(order_id)
+            trade.statusEvent += self._update
+            trade.fillEvent += self._on_fill
+            trade.cancelEvent += self._update
+        self._update(trade)
+        return trade
+
+    def _unfollow(self, trade):
+        trade.statusEvent -= self._update
+        trade.fillEvent -= self._on_fill
+        trade.cancelEvent -= self._update
+
+    def _on_fill(self, trade, fill):
+        self._update(trade)
+
+    def _update(self, trade):
+        order_id = trade.order.orderId
+        status = trade.orderStatus.status
+        previous = self.status.get(order_id)
+        if previous != status:
+            if previous is not None:
+                self.by_status[previous].discard(order_id)
+            self.by_status[status].add(order_id)
+            self.status[order_id] = status
+        if self.on_update is not None:
+            self.on_update(trade)
+
+    def get(self, order_id):
+        return self.trades.get(order_id)
+
+    def with_status(self, *statuses):
+        """
+        Trades currently in any of the statuses, e.g. with_status('Submitted', 'PreSubmitted').
+        """
+        return [self.trades[order_id] for status in statuses for order_id in self.by_status.get(status, ())]
+
+    def active(self, symbol=None):
+        """
+        Working trades (not filled or cancelled), of one symbol or all of them.
+        """
+        if symbol is None:
+            return self.with_status(*OrderStatus.ActiveStates)
+        return [self.trades[order_id] for order_id in self.by_symbol.get(symbol, ())
+                if self.status[order_id] in OrderStatus.ActiveStates]
+
+    def for_symbol(self, symbol):
+        return [self.trades[order_id] for order_id in self.by_symbol.get(symbol, ())]
+
+    def place(self, symbol, action, quantity, price=0):
+        contract = self.contract_factory(symbol) if isinstance(symbol, str) else symbol
+        return self.track(self.ib.placeOrder(contract, make_order(action, quantity, price)))
+
+    def place_many(self, orders):
+        """
+        Places (symbol, action, quantity, price) orders back to back. Returns their trades in the same order.
+        """
+        return [self.place(*order) for order in orders]
+
+    def cancel(self, order_id):
+        """
+        Cancels a working order by id. Returns its trade, or None when the order is unknown or no longer working.
+        """
+        trade = self.trades.get(order_id)
+        if trade is None or self.status[order_id] not in OrderStatus.ActiveStates:
+            return None
+        return self.ib.cancelOrder(trade.order)
+
+    def cancel_many(self, order_ids):
+        return [trade for trade in (self.cancel(order_id) for order_id in list(order_ids)) if trade is not None]
+
+    def cancel_symbol(self, symbol):
+        """
+        Cancels every working order of a symbol.
+        """
+        return self.cancel_many([trade.order.orderId for trade in self.active(symbol)])
+
+    def cancel_all(self):
+        return self.cancel_many([trade.order.orderId for trade in self.active()])
+
+    def forget_done(self):
+        """
+        Drops filled and cancelled trades from the indexes, so the book stays small during long sessions.
+        """
+        for status in OrderStatus.DoneStates:
+            for order_id in list(self.by_status.get(status, ())):
+                trade = self.trades.pop(order_id)
+                self._unfollow(trade)
+                self.by_symbol[_symbol(trade.contract)].discard(order_id)
+                self.by_status[status].discard(order_id)
+                del self.status[order_id]
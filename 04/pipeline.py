@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+if __name__ == '__main__':
+    # Run as a script: the indicators live in lab 2 and their helpers in lab 1
+    for lab in ('01', '02'):
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', lab))
+
+from chaikin.chaikin_oscillator import ChaikinOscillator
+from linear_regression.linear_reg_slope import RollingSlope
+from on_balance_volume.on_balance_volume import OnBalanceVolume
+from records import BAR_DTYPE, TICK_DTYPE, nanoseconds, ticker_price, to_frame
+
+# Finished bars with their up and down volume and indicators
+INDICATOR_BAR_DTYPE = np.dtype(BAR_DTYPE.descr + [('Up', 'f8'), ('Down', 'f8'),
+                                                  ('OBV', 'f8'), ('ADL', 'f8'), ('CHO', 'f8'), ('LRS', 'f8')])
+
+
+class RingBuffer:
+    """
+    Preallocated NumPy array that keeps the last capacity records. Appending never allocates.
+    """
+
+    def __init__(self, capacity, dtype):
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.capacity = capacity
+        self.position = 0
+
+    def __len__(self):
+        return min(self.position, self.capacity)
+
+    def append(self, record):
+        self.data[self.position % self.capacity] = record
+        self.position += 1
+
+    def last(self, count=None):
+        """
+        Copy of the newest count records (all kept records by default), oldest first.
+        """
+        count = len(self) if count is None else min(count, len(self))
+        end = self.position % self.capacity
+        if count <= end:
+            return self.data[end - count:end].copy()
+        return np.concatenate((self.data[self.capacity - (count - end):], self.data[:end]))
+
+
+class _Symbol:
+    __slots__ = ('ticks', 'bars', 'obv', 'chaikin', 'slope', 'bar', 'bucket', 'last_price')
+
+    def __init__(self, tick_capacity, bar_capacity, short_span, long_span, slope_window):
+        self.ticks = RingBuffer(tick_capacity, TICK_DTYPE)
+        self.bars = RingBuffer(bar_capacity, INDICATOR_BAR_DTYPE)
+        self.obv = OnBalanceVolume()
+        self.chaikin = ChaikinOscillator(short_span, long_span)
+        self.slope = RollingSlope(slope_window)
+        # Open bar as [Open, High, Low, Close, Up, Down]
+        self.bar = None
+        self.bucket = None
+        self.last_price = None
+
+
+class TickPipeline:
+    """
+    Turns live ticks into bars and indicators one tick at a time: every tick goes into a preallocated
+    ring buffer of its symbol and updates the open bar, and every finished bar updates OBV, the Chaikin
+    oscillator and the regression slope in O(1) before on_bar(symbol, bar) is called.
+    Bars close like resample_data, when the first tick of a later bar arrives.
+
+    frequency: Bar length understood by pandas, e.g. '1min'
+    on_bar: Called with the symbol and the finished bar, an INDICATOR_BAR_DTYPE record inside the ring buffer that is
+            overwritten bar_capacity bars later
+    """
+
+    def __init__(self, frequency='1min', on_bar=None, tick_capacity=65_536, bar_capacity=4_096, short_span=3,
+                 long_span=10, slope_window=20, latency_capacity=100_000):
+        self.step = pd.Timedelta(frequency).value
+        self.on_bar = on_bar
+        self.options = (tick_capacity, bar_capacity, short_span, long_span, slope_window)
+        self.symbols = {}
+        # Nanoseconds from receiving a tick until it is processed, and until the bar it closed was handed over
+        self.tick_latency = RingBuffer(latency_capacity, np.int64)
+        self.signal_latency = RingBuffer(latency_capacity, np.int64)
+
+    def on_ticker(self, ticker):
+        """
+        Callback for IBService.subscribe or ticker.updateEvent, see records.ticker_price for the price and size.
+        """
+        received = time.perf_counter_ns()
+        price, size = ticker_price(ticker)
+        contract = ticker.contract
+        symbol = contract.pair() if contract.secType == 'CASH' else contract.symbol
+        self.push(symbol, nanoseconds(ticker.time), price, size, received)
+
+    def push(self, symbol, timestamp, price, size, received=None):
+        """
+        Adds one tick. timestamp is in nanoseconds since the epoch.
+        """
+        received = time.perf_counter_ns() if received is None else received
+        state = self.symbols.get(symbol)
+        if state is None:
+            state = self.symbols[symbol] = _Symbol(*self.options)
+        state.ticks.append((timestamp, price, size))
+
+        # Ticks at or above the previous price count as up volume, like the Up and Down columns of the tick data
+        up = state.last_price is None or price >= state.last_price
+        state.last_price = price
+        bucket = timestamp // self.step
+        bar = state.bar
+        if bar is not None and bucket == state.bucket:
+            if price > bar[1]:
+                bar[1] = price
+            elif price < bar[2]:
+                bar[2] = price
+            bar[3] = price
+            bar[4 if up else 5] += size
+        else:
+            if bar is not None:
+                self._close_bar(symbol, state, received)
+            state.bar = [price, price, price, price, size if up else 0., 0. if up else size]
+            state.bucket = bucket
+        self.tick_latency.append(time.perf_counter_ns() - received)
+
+    def _close_bar(self, symbol, state, received):
+        open_, high, low, close, up, down = state.bar
+        volume = up + down
+        chaikin = state.chaikin.update({'Close': close, 'Low': low, 'High': high, 'Volume': volume})
+        record = (state.bucket * self.step, open_, high, low, close, volume, up, down,
+                  state.obv.update(close, volume), chaikin['ADL'], chaikin['CHO'], state.slope.update(close))
+        state.bars.append(record)
+        state.bar = None
+        if self.on_bar is not None:
+            self.on_bar(symbol, state.bars.data[(state.bars.position - 1) % state.bars.capacity])
+        self.signal_latency.append(time.perf_counter_ns() - received)
+
+    def flush(self):
+        """
+        Closes the open bar of every symbol, e.g. at the end of a session.
+        """
+        received = time.perf_counter_ns()
+        for symbol, state in self.symbols.items():
+            if state.bar is not None:
+                self._close_bar(symbol, state, received)
+
+    def bars(self, symbol, count=None):
+        """
+        The newest finished bars of a symbol with their indicators, as an OHLCV frame like resample_data returns.
+        """
+        return to_frame(self.symbols[symbol].bars.last(count))
+
+    def latency(self, percentiles=(50, 90, 99, 99.9)):
+        """
+        Percentiles in microseconds of the per tick processing time and of the tick-to-signal time
+        (from the tick that closed a bar until on_bar returned), over the last latency_capacity samples.
+        """
+        rows = {}
+        for name, samples in (('tick', self.tick_latency), ('signal', self.signal_latency)):
+            values = samples.last() / 1_000
+            rows[name] = dict(zip([f"p{p:g}" for p in percentiles],
+                                  np.percentile(values, percentiles) if len(values) else [np.nan] * len(percentiles)),
+                              max=values.max() if len(values) else np.nan, count=samples.position)
+        return pd.DataFrame(rows).T
+
+
+def replay(pipeline, ticks, symbol='SYNTHETIC'):
+    """
+    Pushes a frame of ticks (e.g. from synthetic.generate_tick_chunks) through the pipeline as fast as possible.
+    """
+    times = ticks.index.values.astype('datetime64[ns]').view(np.int64).tolist()
+    prices = ticks['Close'].to_numpy(dtype=float).tolist()
+    sizes = (ticks['Up'] + ticks['Down']).to_numpy(dtype=float).tolist()
+    for timestamp, price, size in zip(times, prices, sizes):
+        pipeline.push(symbol, timestamp, price, size)
+    return pipeline
+
+
+async def _run_live(symbols, seconds, ib):
+    from service import IBService
+
+    pipeline = TickPipeline(frequency='1s')
+    async with IBService(ib) as service:
+        for symbol in symbols:
+            service.subscribe(symbol, pipeline.on_ticker)
+        await asyncio.sleep(seconds)
+    pipeline.flush()
+    for symbol in symbols:
+        print(pipeline.bars(symbol).tail())
+    return pipeline
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run live or replayed ticks through the bar and indicator pipeline")
+    parser.add_argument('symbols', nargs='*', default=['EURUSD'])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--fake', action='store_true', help="Use the in-process fake gateway instead of TWS")
+    parser.add_argument('--replay', type=int, default=0, help="Replay this many synthetic ticks instead")
+    args = parser.parse_args()
+
+    if args.replay:
+        import synthetic
+        result = replay(TickPipeline(), pd.concat(synthetic.generate_tick_chunks(args.replay, seed=0)))
+    else:
+        from ib_insync import IB
+        from fake_ib import FakeIB
+        result = asyncio.run(_run_live(args.symbols, args.seconds, FakeIB(tick_interval=0.01) if args.fake else IB()))
+    print(result.latency())
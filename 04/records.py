@@ -0,0 +1,119 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# One row per record, times in nanoseconds since the epoch (UTC)
+TICK_DTYPE = np.dtype([('time', 'i8'), ('price', 'f8'), ('size', 'f8')])
+BAR_DTYPE = np.dtype([('time', 'i8'), ('Open', 'f8'), ('High', 'f8'), ('Low', 'f8'), ('Close', 'f8'),
+                      ('Volume', 'f8')])
+
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def nanoseconds(value):
+    """
+    Nanoseconds since the epoch of a datetime or date from ib_insync. Times without a time zone are taken as UTC,
+    so bars have to be requested with formatDate=2: formatDate=1 gives TWS local times without a time zone.
+    """
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    # Whole microseconds avoid the rounding of timestamp() * 1e9
+    return ((value - _EPOCH) // datetime.timedelta(microseconds=1)) * 1_000
+
+
+def ticker_price(ticker):
+    """
+    Price and size of a ticker update. Forex has no trades, so the midpoint is the price and every update
+    counts as one unit of tick volume, like the MetaTrader data in data/.
+    """
+    price = ticker.last if ticker.last == ticker.last else (ticker.bid + ticker.ask) / 2
+    size = ticker.lastSize if ticker.lastSize == ticker.lastSize and ticker.lastSize > 0 else 1.
+    return price, size
+
+
+class Tick:
+    """
+    One price update, a few dozen bytes instead of a whole ib_insync Ticker.
+    """
+    __slots__ = ('time', 'price', 'size')
+
+    def __init__(self, time, price, size):
+        self.time = time
+        self.price = price
+        self.size = size
+
+    @classmethod
+    def from_ticker(cls, ticker):
+        return cls(nanoseconds(ticker.time), *ticker_price(ticker))
+
+    def __iter__(self):
+        return iter((self.time, self.price, self.size))
+
+    def __repr__(self):
+        return f"Tick({pd.Timestamp(self.time)}, price={self.price}, size={self.size})"
+
+
+class Bar:
+    """
+    One OHLCV bar, a compact copy of ib_insync BarData.
+    """
+    __slots__ = ('time', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, time, open, high, low, close, volume):
+        self.time = time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_bar_data(cls, bar):
+        return cls(nanoseconds(bar.date), bar.open, bar.high, bar.low, bar.close, bar.volume)
+
+    def __iter__(self):
+        return iter((self.time, self.open, self.high, self.low, self.close, self.volume))
+
+    def __repr__(self):
+        return (f"Bar({pd.Timestamp(self.time)}, open={self.open}, high={self.high}, low={self.low}, "
+                f"close={self.close}, volume={self.volume})")
+
+
+def ticks_to_array(ticks):
+    """
+    Packs Tick records, or (time, price, size) tuples, into one TICK_DTYPE array.
+    """
+    return np.fromiter((tuple(tick) for tick in ticks), dtype=TICK_DTYPE)
+
+
+def bars_to_array(bars):
+    """
+    Packs Bar records, ib_insync BarData or (time, open, high, low, close, volume) tuples into one BAR_DTYPE array.
+    """
+    return np.fromiter((_bar_tuple(bar) for bar in bars), dtype=BAR_DTYPE)
+
+
+def _bar_tuple(bar):
+    if hasattr(bar, 'date'):
+        return nanoseconds(bar.date), bar.open, bar.high, bar.low, bar.close, bar.volume
+    return tuple(bar)
+
+
+def to_frame(records):
+    """
+    DataFrame of a structured array with a DateTime index, e.g. the OHLCV frame of a BAR_DTYPE array that
+    the lab 2 indicators take. The columns are copies, the array can be reused afterwards.
+    """
+    return pd.DataFrame({name: records[name].copy() for name in records.dtype.names if name != 'time'},
+                        index=pd.DatetimeIndex(records['time'].astype('datetime64[ns]'), name='DateTime'))
+
+
+def bars_frame(bars):
+    """
+    OHLCV frame of ib_insync bars, a lighter replacement for util.df(bars).
+    """
+    return to_frame(bars_to_array(bars))
@@ -0,0 +1,216 @@
+import argparse
+import asyncio
+import logging
+
+from ib_insync import IB, Forex
+
+from records import bars_frame
+
+logger = logging.getLogger(__name__)
+
+# Seconds per unit of an IB duration string, e.g. '2 D'. Months and years are approximated
+DURATION_UNITS = {'S': 1, 'D': 86_400, 'W': 7 * 86_400, 'M': 30 * 86_400, 'Y': 365 * 86_400}
+
+# Seconds per unit of an IB bar size setting, e.g. '5 mins' or '1 hour'
+BAR_SIZE_UNITS = {'sec': 1, 'secs': 1, 'min': 60, 'mins': 60, 'hour': 3_600, 'hours': 3_600,
+                  'day': 86_400, 'week': 7 * 86_400, 'month': 30 * 86_400}
+
+
+def duration_seconds(duration):
+    """
+    Length of an IB duration string such as '1 M' in seconds.
+    """
+    count, unit = duration.split()
+    return int(count) * DURATION_UNITS[unit.upper()]
+
+
+def bar_size_seconds(bar_size):
+    """
+    Length of an IB bar size setting such as '1 min' in seconds.
+    """
+    count, unit = bar_size.split()
+    return int(count) * BAR_SIZE_UNITS[unit.lower()]
+
+
+class IBService:
+    """
+    Keeps one connection to TWS or IB Gateway for the whole process and shares it between any number of
+    market data subscriptions and concurrent historical requests. When the connection drops it reconnects
+    with exponential backoff and requests every subscription again.
+
+    ib: ib_insync.IB, or anything with the same async interface such as fake_ib.FakeIB
+    contract_factory: Turns a symbol into a contract, Forex like create_contract in main.py by default
+    max_concurrent_requests: Historical requests in flight at once, the rest wait for a free slot
+    """
+
+    def __init__(self, ib=None, host='127.0.0.1', port=7497, client_id=1, contract_factory=Forex,
+                 max_concurrent_requests=10, reconnect_delay=1.0, max_reconnect_delay=30.0, request_retries=3):
+        self.ib = ib or IB()
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.contract_factory = contract_factory
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.request_retries = request_retries
+        # Symbol -> {'contract', 'ticker', 'callbacks'}, one market data line per symbol however many listeners
+        self.subscriptions = {}
+        self._requests = asyncio.Semaphore(max_concurrent_requests)
+        self._connected = asyncio.Event()
+        self._reconnect_task = None
+        self._stopping = False
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    async def start(self):
+        self._stopping = False
+        self.ib.disconnectedEvent += self._on_disconnected
+        await self._connect()
+
+    def stop(self):
+        self._stopping = True
+        self.ib.disconnectedEvent -= self._on_disconnected
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self.ib.isConnected():
+            for subscription in self.subscriptions.values():
+                self.ib.cancelMktData(subscription['contract'])
+            self.ib.disconnect()
+        self._connected.clear()
+
+    async def _connect(self):
+        delay = self.reconnect_delay
+        while not self._stopping:
+            try:
+                await self.ib.connectAsync(self.host, self.port, clientId=self.client_id)
+                break
+            except (OSError, ConnectionError, asyncio.TimeoutError) as error:
+                logger.warning("Connecting to %s:%s failed (%s), retrying in %.1f s", self.host, self.port, error,
+                               delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+        else:
+            return
+        for subscription in self.subscriptions.values():
+            self._request_market_data(subscription)
+        self._connected.set()
+        logger.info("Connected to %s:%s with %d subscriptions", self.host, self.port, len(self.subscriptions))
+
+    def _on_disconnected(self):
+        self._connected.clear()
+        if self._stopping or (self._reconnect_task and not self._reconnect_task.done()):
+            return
+        logger.warning("Connection to %s:%s lost, reconnecting", self.host, self.port)
+        self._reconnect_task = asyncio.ensure_future(self._connect())
+
+    def _request_market_data(self, subscription):
+        # After a reconnect the ticker may be a new object or the old one again, so listeners move over once
+        if subscription['ticker'] is not None:
+            for callback in subscription['callbacks']:
+                subscription['ticker'].updateEvent -= callback
+        subscription['ticker'] = self.ib.reqMktData(subscription['contract'], '', False, False)
+        for callback in subscription['callbacks']:
+            subscription['ticker'].updateEvent += callback
+
+    def subscribe(self, symbol, callback):
+        """
+        Calls callback(ticker) on every market data update of symbol, until unsubscribe.
+        Subscriptions made while disconnected start when the connection is back.
+        """
+        subscription = self.subscriptions.get(symbol)
+        if subscription is None:
+            subscription = self.subscriptions[symbol] = {
+                'contract': self.contract_factory(symbol), 'ticker': None, 'callbacks': [],
+            }
+        subscription['callbacks'].append(callback)
+        if subscription['ticker'] is not None:
+            subscription['ticker'].updateEvent += callback
+        elif self.connected:
+            self._request_market_data(subscription)
+        return subscription['ticker']
+
+    def unsubscribe(self, symbol, callback=None):
+        """
+        Removes one callback of symbol, or all of them. The market data line is cancelled with the last one.
+        """
+        subscription = self.subscriptions.get(symbol)
+        if subscription is None:
+            return
+        callbacks = subscription['callbacks'] if callback is None else [callback]
+        for removed in list(callbacks):
+            subscription['callbacks'].remove(removed)
+            if subscription['ticker'] is not None:
+                subscription['ticker'].updateEvent -= removed
+        if not subscription['callbacks']:
+            del self.subscriptions[symbol]
+            if self.connected:
+                self.ib.cancelMktData(subscription['contract'])
+
+    async def historical(self, symbol, duration, bar_size, end='', what_to_show='MIDPOINT', use_rth=True):
+        """
+        Requests historical bars like fetch_and_visualize in main.py, without touching the shared connection.
+        Returns an OHLCV frame with a UTC DateTime index (see records.bars_frame).
+        A request cut off by a disconnect is sent again once the connection is back.
+        """
+        contract = self.contract_factory(symbol) if isinstance(symbol, str) else symbol
+        async with self._requests:
+            for attempt in range(self.request_retries):
+                await self._connected.wait()
+                try:
+                    bars = await self.ib.reqHistoricalDataAsync(
+                        contract, endDateTime=end, durationStr=duration, barSizeSetting=bar_size,
+                        whatToShow=what_to_show, useRTH=use_rth, formatDate=2,
+                    )
+                except ConnectionError as error:
+                    logger.warning("Historical request for %s failed (%s), attempt %d", symbol, error, attempt + 1)
+                    continue
+                return bars_frame(bars)
+        raise ConnectionError(f"Historical request for {symbol} failed {self.request_retries} times")
+
+    async def historical_many(self, symbols, duration, bar_size, **options):
+        """
+        Requests the same history for many symbols concurrently. Returns symbol -> DataFrame.
+        """
+        frames = await asyncio.gather(*(self.historical(symbol, duration, bar_size, **options)
+                                         for symbol in symbols))
+        return dict(zip(symbols, frames))
+
+
+def _print_update(ticker):
+    print(f"{ticker.contract.symbol}{ticker.contract.currency} {ticker.time:%H:%M:%S} "
+          f"bid {ticker.bid} ask {ticker.ask}")
+
+
+async def _run(symbols, seconds, ib):
+    async with IBService(ib) as service:
+        histories = await service.historical_many(symbols, '1 D', '1 hour')
+        for symbol, data in histories.items():
+            print(f"{symbol}: {len(data)} hourly bars")
+        for symbol in symbols:
+            service.subscribe(symbol, _print_update)
+        await asyncio.sleep(seconds)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stream quotes of many symbols over one IB connection")
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--fake', action='store_true', help="Use the in-process fake gateway instead of TWS")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.fake:
+        from fake_ib import FakeIB
+        ib = FakeIB()
+    else:
+        ib = IB()
+    asyncio.run(_run(args.symbols, args.seconds, ib))
@@ -0,0 +1,53 @@
+import asyncio
+
+import pandas as pd
+
+from fake_ib import FakeIB
+from history import HistoryDownloader
+
+
+def _download(ib, cache_dir, start, end, **options):
+    async def run():
+        if not ib.isConnected():
+            await ib.connectAsync()
+        return await HistoryDownloader(ib, cache_dir=cache_dir, **options).download('EURUSD', start, end)
+    return asyncio.run(run())
+
+
+def test_repeated_download_skips_closed_days(tmp_path):
+    # 2024-01-06 and 2024-01-07 are a weekend without bars
+    ib = FakeIB(closed_days=(5, 6))
+    data = _download(ib, str(tmp_path), '2024-01-04', '2024-01-10')
+    assert len(ib.historical_requests) == 6
+    assert len(data) == 4 * 1_440
+    assert not data.index.weekday.isin([5, 6]).any()
+    assert data.index.is_unique and data.index.is_monotonic_increasing
+
+    again = _download(ib, str(tmp_path), '2024-01-04', '2024-01-10')
+    assert len(ib.historical_requests) == 6
+    assert again.equals(data)
+
+    # Only the new tail is requested
+    _download(ib, str(tmp_path), '2024-01-04', '2024-01-12')
+    assert len(ib.historical_requests) == 8
+
+
+def test_empty_chunks_after_errors_are_requested_again(tmp_path):
+    # Every request beyond the third is a pacing violation without bars
+    ib = FakeIB(max_requests=3, pacing_window=600)
+    data = _download(ib, str(tmp_path), '2024-01-01', '2024-01-06', max_requests=100)
+    assert ib.pacing_violations == 2
+    assert len(data) == 3 * 1_440
+
+    ib.max_requests = 100
+    data = _download(ib, str(tmp_path), '2024-01-01', '2024-01-06', max_requests=100)
+    assert len(ib.historical_requests) == 7
+    assert len(data) == 5 * 1_440
+
+
+def test_unsettled_empty_chunks_are_requested_again(tmp_path):
+    ib = FakeIB(closed_days=range(7))
+    start = pd.Timestamp.now(tz='UTC').tz_localize(None).floor('D') - pd.Timedelta(days=1)
+    assert _download(ib, str(tmp_path), start, start + pd.Timedelta(hours=12), settle_time='2D').empty
+    assert _download(ib, str(tmp_path), start, start + pd.Timedelta(hours=12), settle_time='2D').empty
+    assert len(ib.historical_requests) == 2
@@ -0,0 +1,56 @@
+import asyncio
+
+from ib_insync import OrderStatus
+
+from fake_ib import FakeIB
+from orders import OrderBook
+from service import IBService
+
+
+def test_batch_place_fill_and_cancel():
+    async def run():
+        ib = FakeIB()
+        await ib.connectAsync()
+        book = OrderBook(ib)
+        trades = book.place_many([('EURUSD', 'BUY', 1_000, 1.05)] * 3 + [('GBPUSD', 'SELL', 2_000, 1.3)])
+        await asyncio.sleep(0.01)
+        assert len(book.active()) == 4 and len(book.active('EURUSD')) == 3
+
+        ib.fill(trades[0].order.orderId)
+        assert book.status[trades[0].order.orderId] == OrderStatus.Filled
+        assert len(book.cancel_symbol('EURUSD')) == 2
+        await asyncio.sleep(0.01)
+        assert [trade.order.orderId for trade in book.active()] == [trades[3].order.orderId]
+
+        book.forget_done()
+        assert len(book) == 1 and book.for_symbol('EURUSD') == []
+        ib.disconnect()
+    asyncio.run(run())
+
+
+def test_reconnect_replaces_stale_trades():
+    async def run():
+        ib = FakeIB()
+        updates = []
+        async with IBService(ib, reconnect_delay=0.01) as service:
+            book = OrderBook(service.ib, on_update=updates.append)
+            stale = book.place('EURUSD', 'BUY', 1_000, 1.05)
+            await asyncio.sleep(0.01)
+
+            ib.drop_connection()
+            await asyncio.sleep(0.1)
+            assert ib.isConnected() and ib.connections == 2
+            order_id = stale.order.orderId
+            fresh = book.get(order_id)
+            assert fresh is not stale and fresh is ib.orders[order_id]
+
+            ib.fill(order_id)
+            assert book.status[order_id] == OrderStatus.Filled and updates[-1] is fresh
+            book.forget_done()
+            assert len(book) == 0 and book.by_symbol['EURUSD'] == set()
+
+            # The stale object no longer reaches the book
+            count = len(updates)
+            stale.statusEvent.emit(stale)
+            assert len(updates) == count
+    asyncio.run(run())
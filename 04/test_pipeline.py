@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import fun
+from chaikin.chaikin_oscillator import chaikin_oscillator
+from linear_regression.linear_reg_slope import RollingSlope, rolling_slopes
+from on_balance_volume.on_balance_volume import on_balance_volume_values
+from pipeline import RingBuffer, TickPipeline, replay
+
+TICKS = {'seed': 5, 'interval': '2s', 'session': ('09:30', '11:00')}
+
+
+def test_bars_and_indicators_match_batch(synthetic_ticks):
+    ticks = synthetic_ticks(20_000, **TICKS)
+    closed = []
+    pipeline = replay(TickPipeline('1min', on_bar=lambda symbol, bar: closed.append(bar['time'])), ticks)
+    pipeline.flush()
+    bars = pipeline.bars('SYNTHETIC')
+    assert len(closed) == len(bars)
+
+    expected = fun.resample_data(ticks.copy(), frequency='1min')
+    pd.testing.assert_frame_equal(bars[['Open', 'High', 'Low', 'Close', 'Volume']], expected, check_dtype=False,
+                                  check_freq=False, check_names=False)
+
+    close, volume = bars['Close'].to_numpy(), bars['Volume'].to_numpy()
+    np.testing.assert_allclose(bars['OBV'], on_balance_volume_values(close, volume))
+    chaikin = chaikin_oscillator(bars[['Open', 'High', 'Low', 'Close', 'Volume']].copy())
+    np.testing.assert_allclose(bars['ADL'], chaikin['ADL'], rtol=1e-9)
+    np.testing.assert_allclose(bars['CHO'], chaikin['CHO'], rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(bars['LRS'], rolling_slopes(close, [20])[0], rtol=1e-9, atol=1e-12)
+
+
+def test_bar_buffer_keeps_the_newest_bars(synthetic_ticks):
+    ticks = synthetic_ticks(5_000, **TICKS)
+    everything = replay(TickPipeline(), ticks)
+    wrapped = replay(TickPipeline(bar_capacity=16), ticks)
+    pd.testing.assert_frame_equal(wrapped.bars('SYNTHETIC'), everything.bars('SYNTHETIC').iloc[-16:])
+    pd.testing.assert_frame_equal(wrapped.bars('SYNTHETIC', 5), everything.bars('SYNTHETIC').iloc[-5:])
+
+
+def test_ring_buffer_wraps_around():
+    buffer = RingBuffer(4, np.int64)
+    for value in range(10):
+        buffer.append(value)
+    assert len(buffer) == 4
+    assert buffer.last().tolist() == [6, 7, 8, 9] and buffer.last(3).tolist() == [7, 8, 9]
+    assert buffer.last(10).tolist() == [6, 7, 8, 9]
+
+
+@pytest.mark.parametrize('window', [2, 5, 20])
+def test_streaming_slope_matches_rolling_slopes(window):
+    rng = np.random.default_rng(window)
+    values = 100 + np.cumsum(rng.normal(0, 1, 500))
+    values[[3, 100, 101, 250]] = np.nan
+    slope = RollingSlope(window)
+    streamed = [slope.update(value) for value in values]
+    np.testing.assert_allclose(streamed, rolling_slopes(values, [window])[0], rtol=1e-9, atol=1e-9)
+
+    warmed = RollingSlope(window)
+    warmed.warm_up(values[:300])
+    np.testing.assert_allclose([warmed.update(value) for value in values[300:]], streamed[300:], rtol=1e-9,
+                               atol=1e-9)
@@ -0,0 +1,36 @@
+import asyncio
+import datetime
+
+import numpy as np
+import pandas as pd
+from ib_insync import BarData
+
+from fake_ib import FakeIB
+from records import Bar, bars_frame, bars_to_array, nanoseconds
+from service import IBService
+
+
+def test_nanoseconds_are_utc():
+    utc = datetime.datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc)
+    eastern = utc.astimezone(datetime.timezone(datetime.timedelta(hours=-5)))
+    assert nanoseconds(utc) == nanoseconds(eastern) == nanoseconds(utc.replace(tzinfo=None)) == pd.Timestamp(utc).value
+    assert nanoseconds(datetime.date(2024, 1, 2)) == pd.Timestamp('2024-01-02').value
+
+
+def test_bars_frame_matches_the_bar_data():
+    bars = [BarData(date=datetime.datetime(2024, 1, 2, 9, minute, tzinfo=datetime.timezone.utc), open=1.0 + minute,
+                    high=2.0 + minute, low=0.5, close=1.5, volume=10 * minute) for minute in range(3)]
+    data = bars_frame(bars)
+    assert data.index.equals(pd.date_range('2024-01-02 09:00', periods=3, freq='min', name='DateTime'))
+    assert data['Open'].tolist() == [1.0, 2.0, 3.0]
+    assert data['Volume'].tolist() == [0, 10, 20]
+    assert np.array_equal(bars_to_array([Bar.from_bar_data(bar) for bar in bars]), bars_to_array(bars))
+
+
+def test_service_history_is_in_utc():
+    async def run():
+        async with IBService(FakeIB()) as service:
+            return await service.historical('EURUSD', '3600 S', '1 min',
+                                            end=datetime.datetime(2024, 1, 2, 12, tzinfo=datetime.timezone.utc))
+    data = asyncio.run(run())
+    assert data.index[0] == pd.Timestamp('2024-01-02 11:00') and data.index[-1] == pd.Timestamp('2024-01-02 11:59')
@@ -0,0 +1,52 @@
+import asyncio
+
+import pandas as pd
+
+from fake_ib import FakeIB
+from service import IBService
+
+
+def test_reconnect_resubscribes_market_data():
+    async def run():
+        ib = FakeIB(tick_interval=0.01, refused_connections=2)
+        updates = []
+        async with IBService(ib, reconnect_delay=0.01) as service:
+            assert ib.connections == 1
+            service.subscribe('EURUSD', updates.append)
+            await asyncio.sleep(0.05)
+            first = service.subscriptions['EURUSD']['ticker']
+            assert updates and all(ticker is first for ticker in updates)
+
+            ib.refused_connections = 2
+            ib.drop_connection()
+            assert not service.connected
+            await asyncio.sleep(0.1)
+            assert service.connected and ib.connections == 2
+
+            # The updates go on from the ticker of the new connection, to the same listener only once
+            count = len(updates)
+            second = service.subscriptions['EURUSD']['ticker']
+            await asyncio.sleep(0.05)
+            assert second is not first and len(updates) > count
+            assert all(ticker is second for ticker in updates[count:])
+            assert len(second.updateEvent) == 1
+
+            service.unsubscribe('EURUSD')
+            assert 'EURUSD' not in ib.tickers and service.subscriptions == {}
+        assert not ib.isConnected()
+    asyncio.run(run())
+
+
+def test_historical_requests_wait_for_the_connection():
+    async def run():
+        ib = FakeIB(latency=0.01)
+        async with IBService(ib, reconnect_delay=0.02, max_concurrent_requests=2) as service:
+            ib.drop_connection()
+            histories = await service.historical_many(['EURUSD', 'GBPUSD', 'USDJPY'], '1 D', '1 hour')
+            assert ib.connections == 2
+            assert [len(data) for data in histories.values()] == [24] * 3
+            assert [request[0] for request in ib.historical_requests] == ['EURUSD', 'GBPUSD', 'USDJPY']
+            # The index is UTC without a time zone, like every records frame
+            now = pd.Timestamp.now(tz='UTC').tz_localize(None)
+            assert all(now - pd.Timedelta('2h') < data.index[-1] <= now for data in histories.values())
+    asyncio.run(run())
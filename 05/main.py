@@ -1,22 +1,29 @@
 import importlib
+import os
+import sys
+
 import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 import pandas as pd
-import yfinance as yf
+
+# Lab 3 imports its siblings by name and instrument from lab 1
+for lab in ('01', '03'):
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', lab))
 
 plot_data = importlib.import_module("03.plot").plot_data
 calculate_return = importlib.import_module("03.strategy").calculate_return
 bollinger_bands_strategy = importlib.import_module("03.strategy").bollinger_bands_strategy
 optimize_strategy = importlib.import_module("03.strategy").optimize_strategy
+YahooProvider = importlib.import_module("03.providers").YahooProvider
+strategy_windows = importlib.import_module("03.strategy").strategy_windows
+panel = importlib.import_module("03.panel")
 
 start_date = "2020-01-01"
 end_date = "2021-01-01"
 tickers = ["MARA", "AAPL", "GOOGL", "AMZN", "TSLA", "AMD", "NVDA", "AAL", "UAL", "DAL"]
-data_dict = {
-    ticker: yf.download(ticker, start=start_date, end=end_date, progress=False)
-    for ticker in tickers
-}
+# Concurrent downloads, cached on disk so reruns only fetch missing dates
+data_dict = YahooProvider().get_many(tickers, start_date, end_date)
 
 window = (10, 50)
 take_profit = 0.05
@@ -36,7 +43,7 @@ def run(ticker):
         data.copy(), window, take_profit, stop_loss
     )
     strategy_data, optimized_window, optimised_strategy_cumulative_return, optimised_strategy_return = optimize_strategy(
-        data.copy(), take_profit, stop_loss
+        data.copy(), take_profit, stop_loss, workers=None
     )
 
     print(f"Ticker: {ticker}")
@@ -49,6 +56,15 @@ def run(ticker):
     return (fix, ax), strategy_cumulative_return, optimised_strategy_cumulative_return, optimised_strategy_return
 
 
+def run_panel():
+    # Every ticker and every window of the optimizer grid in one vectorized pass
+    closes = panel.align_closes(data_dict)
+    _, summary = panel.panel_backtest(closes, strategy_windows(), take_profit, stop_loss)
+    best = panel.best_windows(summary)
+    print(best)
+    return summary
+
+
 def combine_plots(figs_axes):
     valid_figs_axes = [fa for fa in figs_axes if fa is not None]
     num_plots = len(valid_figs_axes)
@@ -97,7 +113,9 @@ def plot_correlation(data):
     plt.show()
 
 
-if __name__ == "__main__":
+if __name__ == "__main__" and '--panel' in sys.argv:
+    run_panel()
+elif __name__ == "__main__":
     figs_axes = []
     all_optimised_returns = []
     all_returns = []
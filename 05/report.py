@@ -0,0 +1,119 @@
+import argparse
+import importlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+# Render without a display, every chart goes straight to a file
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import pandas as pd
+
+# Lab 3 imports instrument from lab 1
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '01'))
+
+plot_data = importlib.import_module("03.plot").plot_data
+calculate_return = importlib.import_module("03.strategy").calculate_return
+optimize_strategy = importlib.import_module("03.strategy").optimize_strategy
+providers = importlib.import_module("03.providers")
+
+start_date = "2020-01-01"
+end_date = "2021-01-01"
+tickers = ["MARA", "AAPL", "GOOGL", "AMZN", "TSLA", "AMD", "NVDA", "AAL", "UAL", "DAL"]
+window = (10, 50)
+take_profit = 0.05
+stop_loss = 0.01
+
+# Columns of the strategy frame that the charts draw
+CHART_COLUMNS = ['Close', 'SMA_short', 'SMA_long', 'Signal', 'Buy', 'Sell']
+
+
+def render_ticker(ticker, data, output_dir, file_format='png'):
+    """
+    Runs the default and the optimized strategy for one ticker and saves the optimized chart.
+    Returns the summary row and the chart data for the combined grid.
+    """
+    data.set_index(pd.to_datetime(data.index), inplace=True)
+    _, strategy_cumulative_return, _ = calculate_return(data.copy(), window, take_profit, stop_loss)
+    # The report already runs one ticker per process, so the grid search stays in this process
+    strategy_data, optimized_window, optimized_cumulative_return, optimized_return = optimize_strategy(
+        data.copy(), take_profit, stop_loss, workers=1
+    )
+
+    fig, _ = plot_data(strategy_data, ticker, optimized_window, show=False)
+    fig.savefig(os.path.join(output_dir, f"{ticker}.{file_format}"))
+    plt.close(fig)
+
+    summary = {
+        'Ticker': ticker,
+        'Optimized Window': optimized_window,
+        'Strategy Cumulative Return': strategy_cumulative_return.iloc[-1],
+        # optimize_strategy returns plain zeros when no window is profitable
+        'Optimized Cumulative Return': pd.Series(optimized_cumulative_return).iloc[-1],
+        'Optimized Sharpe Ratio': pd.Series(optimized_return).mean() / pd.Series(optimized_return).std(),
+    }
+    chart = strategy_data[[column for column in CHART_COLUMNS if column in strategy_data.columns]]
+    return summary, (ticker, optimized_window, chart)
+
+
+def render_grid(charts, path, cols=3):
+    """
+    Draws every ticker chart into one grid figure and saves it.
+    """
+    rows = max(-(-len(charts) // cols), 1)
+    fig, axs = plt.subplots(rows, cols, figsize=(20, 4.5 * rows), squeeze=False)
+    for ax, (ticker, ticker_window, chart) in zip(axs.flat, charts):
+        plot_data(chart, ticker, ticker_window, ax=ax, show=False)
+    for ax in axs.flat[len(charts):]:
+        ax.set_visible(False)
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def render_report(data_dict, output_dir, file_format='png', workers=None):
+    """
+    Renders one chart per ticker, the combined grid and a summary CSV into output_dir using a process pool.
+
+    data_dict: Ticker -> OHLC DataFrame, tickers without data are skipped
+    workers: Number of processes, None uses every core
+    """
+    if all(data.empty for data in data_dict.values()):
+        raise ValueError(f"No data for any of {', '.join(data_dict)}, nothing to report")
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render_ticker, ticker, data, output_dir, file_format)
+                   for ticker, data in data_dict.items() if not data.empty]
+        results = [future.result() for future in futures]
+        summaries = [summary for summary, _ in results]
+        charts = [chart for _, chart in results]
+        grid = executor.submit(render_grid, charts, os.path.join(output_dir, f"combined.{file_format}"))
+        grid.result()
+
+    summary = pd.DataFrame(summaries)
+    summary.to_csv(os.path.join(output_dir, 'summary.csv'), index=False)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the strategy report for many tickers without a display")
+    parser.add_argument('output_dir')
+    parser.add_argument('--tickers', nargs='+', default=tickers)
+    parser.add_argument('--format', default='png', choices=['png', 'svg'])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--offline', action='store_true', help="Serve the CSV files in data/ instead of downloading")
+    parser.add_argument('--start', help=f"First date, {start_date} by default or the whole CSV files when offline")
+    parser.add_argument('--end', help=f"Date after the last one, {end_date} by default or the whole CSV files when offline")
+    args = parser.parse_args()
+
+    provider = providers.CsvProvider() if args.offline else providers.YahooProvider()
+    start, end = start_date, end_date
+    if args.offline:
+        start, end = provider.date_range(args.tickers) or (start, end)
+    start, end = args.start or start, args.end or end
+    data_dict = provider.get_many(args.tickers, start, end)
+    print(render_report(data_dict, args.output_dir, args.format, args.workers))
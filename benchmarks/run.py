@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for lab in ('01', '02', '03'):
+    sys.path.append(os.path.join(ROOT, lab))
+
+import fun
+import strategy
+import synthetic
+from chaikin.chaikin_oscillator import chaikin_oscillator
+from linear_regression.linear_reg_slope import linear_regression_slope
+from on_balance_volume.on_balance_volume import on_balance_volume
+
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5]
+
+
+def make_bars(size):
+    return synthetic.generate_bars(size, seed=0)
+
+
+def make_ticks(size):
+    return pd.concat(synthetic.generate_tick_chunks(size, seed=0))
+
+
+def make_tick_csv(size, directory):
+    """
+    Writes generated ticks in the Date,Time,... layout of data/100_tick_tsla.csv and returns the file path.
+    """
+    path = os.path.join(directory, f"ticks_{size}.csv")
+    if not os.path.exists(path):
+        synthetic.write_csv(synthetic.generate_tick_chunks(size, seed=0), path)
+    return path
+
+
+def _slope(size, directory):
+    close = make_bars(size)['Close']
+    return lambda: linear_regression_slope(close, window=20)
+
+
+def _obv(size, directory):
+    bars = make_bars(size)
+    return lambda: on_balance_volume(bars.copy())
+
+
+def _chaikin(size, directory):
+    bars = make_bars(size)
+    return lambda: chaikin_oscillator(bars.copy())
+
+
+def _load(size, directory):
+    path = make_tick_csv(size, directory)
+    return lambda: fun.load_data(path, date_col='Date', time_col='Time', use_cache=False)
+
+
+def _resample(size, directory):
+    ticks = make_ticks(size)
+    return lambda: fun.resample_data(ticks.copy(), frequency='1min')
+
+
+def _calculate_return(size, directory):
+    closes = make_bars(size)[['Close']]
+    return lambda: strategy.calculate_return(closes.copy(), (10, 50), 0.05, 0.01)
+
+
+def _optimize(size, directory):
+    closes = make_bars(size)[['Close']]
+    return lambda: strategy.optimize_strategy(closes.copy(), 0.05, 0.01)
+
+
+# Case name -> (largest size it runs at by default, setup(size, directory) returning the call to time)
+CASES = {
+    'linear_regression_slope': (10 ** 7, _slope),
+    'on_balance_volume': (10 ** 7, _obv),
+    'chaikin_oscillator': (10 ** 7, _chaikin),
+    'load_data': (10 ** 6, _load),
+    'resample_data': (10 ** 7, _resample),
+    'calculate_return': (10 ** 7, _calculate_return),
+    'optimize_strategy': (10 ** 5, _optimize),
+}
+
+
+def measure(call, repeat):
+    """
+    Returns the best wall time of repeat calls and the peak traced memory of one more call.
+    """
+    seconds = min(_timed(call) for _ in range(repeat))
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def _timed(call):
+    start = time.perf_counter()
+    call()
+    return time.perf_counter() - start
+
+
+def run(names, sizes, repeat, max_size=None):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name in names:
+            default_max_size, setup = CASES[name]
+            for size in sizes:
+                if size > (max_size or default_max_size):
+                    continue
+                seconds, peak = measure(setup(size, directory), repeat)
+                results.append({'name': name, 'size': size, 'seconds': seconds, 'peak_bytes': peak})
+                print(f"{name:<25} {size:>10} {seconds:>10.4f} s {peak / 2 ** 20:>10.1f} MiB", flush=True)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns the (name, size, baseline seconds, seconds) of every case that is threshold times slower than the baseline.
+    """
+    previous = {(result['name'], result['size']): result['seconds'] for result in baseline['results']}
+    return [(result['name'], result['size'], previous[(result['name'], result['size'])], result['seconds'])
+            for result in results
+            if (result['name'], result['size']) in previous
+            and result['seconds'] > previous[(result['name'], result['size'])] * threshold]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the indicators, loaders and backtests at several data sizes")
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=list(CASES))
+    parser.add_argument('--sizes', nargs='+', type=lambda value: int(float(value)), default=DEFAULT_SIZES,
+                        help="Number of bars, e.g. 1e3 1e5 1e7")
+    parser.add_argument('--max-size', type=lambda value: int(float(value)), default=None,
+                        help="Run every case up to this size instead of its own default limit")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', help="JSON results of an earlier commit to compare against")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="Fail when a case is this many times slower than in the baseline")
+    args = parser.parse_args()
+
+    results = run(args.cases, args.sizes, args.repeat, args.max_size)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'environment': environment(), 'results': results}, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            slower = compare(results, json.load(file), args.threshold)
+        for name, size, before, after in slower:
+            print(f"SLOWER: {name} at {size} bars: {before:.4f} s -> {after:.4f} s ({after / before:.2f}x)")
+        if slower:
+            sys.exit(1)
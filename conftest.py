@@ -0,0 +1,91 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The labs import each other by module name, like their entry scripts set up
+ROOT = os.path.dirname(os.path.abspath(__file__))
+for lab in ('01', '02', '03', '04'):
+    sys.path.append(os.path.join(ROOT, lab))
+
+from synthetic import generate_tick_chunks  # noqa: E402
+
+# Data the tests of several labs share. Each fixture is a function, so a test can ask for other lengths or seeds
+
+
+def _prices(length=400, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2020-01-01', periods=length, freq='D')
+    return pd.DataFrame({'Close': 100 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))}, index=index)
+
+
+def _ohlcv_bars(length=500, seed=0):
+    # Closes are rounded to 0.1, so some of them repeat the previous one
+    rng = np.random.default_rng(seed)
+    close = np.round(100 + np.cumsum(rng.normal(0, 0.5, length)), 1)
+    low = close - rng.uniform(0, 1, length)
+    high = close + rng.uniform(0, 1, length)
+    index = pd.date_range('2024-01-01', periods=length, freq='min')
+    return pd.DataFrame({'Open': close, 'High': high, 'Low': low, 'Close': close,
+                         'Volume': rng.integers(1, 1_000, length).astype(float)}, index=index)
+
+
+def _synthetic_ticks(count, seed=0, interval='1s', session=('09:30', '16:00')):
+    ticks = pd.concat(generate_tick_chunks(count, seed=seed, interval=interval, session=session))
+    ticks.index.name = 'DateTime'
+    return ticks
+
+
+def _loop_exits(close, signal, take_profit, stop_loss, close_at_end=False):
+    # The exit loop calculate_return had before it was vectorized. close_at_end also closes the position still
+    # open on the last bar, like walk-forward ranges do, unless it was entered on that bar
+    returns = np.zeros(len(close))
+    exits = np.zeros(len(close), dtype=bool)
+    open_price = None
+    for i in range(1, len(close)):
+        if signal[i] == 1 and signal[i - 1] == -1:
+            open_price = close[i]
+        elif open_price is not None:
+            change = close[i] / open_price - 1
+            if change >= take_profit or change <= -stop_loss or signal[i] == -1:
+                returns[i] = take_profit if change >= take_profit else -stop_loss if change <= -stop_loss else change
+                exits[i] = True
+                open_price = None
+    if close_at_end and open_price is not None and not (signal[-1] == 1 and signal[-2] == -1):
+        returns[-1] = close[-1] / open_price - 1
+        exits[-1] = True
+    return returns, exits
+
+
+@pytest.fixture
+def prices():
+    """
+    prices(length=400, seed=0): daily Close prices of a random walk.
+    """
+    return _prices
+
+
+@pytest.fixture
+def ohlcv_bars():
+    """
+    ohlcv_bars(length=500, seed=0): minute OHLCV bars.
+    """
+    return _ohlcv_bars
+
+
+@pytest.fixture
+def synthetic_ticks():
+    """
+    synthetic_ticks(count, seed=0, interval='1s', session=('09:30', '16:00')): one frame of synthetic trades.
+    """
+    return _synthetic_ticks
+
+
+@pytest.fixture
+def loop_exits():
+    """
+    loop_exits(close, signal, take_profit, stop_loss, close_at_end=False): (returns, exits) of the original loop.
+    """
+    return _loop_exits